@@ -1,20 +1,44 @@
 #!/usr/bin/env python3
 """
 Script to check if Kafka is running and accessible.
+
+Brokers are probed concurrently with asyncio. For each broker the script
+opens a TCP connection and performs a protocol-level handshake
+(ApiVersions + Metadata), reporting connect and handshake latency, the
+cluster controller and topic/partition counts.
+
+Usage:
+    python3 check_kafka.py [broker ...] [--timeout SECONDS] [--json]
+    python3 check_kafka.py HOST PORT
 """
+import argparse
+import asyncio
+import json
 import socket
+import struct
 import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+API_KEY_METADATA = 3
+API_KEY_API_VERSIONS = 18
+CLIENT_ID = b'check_kafka'
+
+# Metadata versions this probe can encode: v9+ use flexible (tagged-field)
+# encoding, and Kafka 4.x no longer serves v0-v3.
+METADATA_VERSIONS = range(1, 9)
 
 
 def check_kafka_port(host='localhost', port=9092, timeout=2):
     """
     Check if Kafka is accessible on the given host and port.
-    
+
     Args:
         host: Kafka host
         port: Kafka port
         timeout: Connection timeout in seconds
-        
+
     Returns:
         True if accessible, False otherwise
     """
@@ -29,25 +53,313 @@ def check_kafka_port(host='localhost', port=9092, timeout=2):
         return False
 
 
+def parse_broker(broker: str, default_port: int = 9092) -> Tuple[str, int]:
+    """
+    Split a 'host[:port]' or '[ipv6][:port]' string into host and port.
+
+    Args:
+        broker: Broker address
+        default_port: Port used when the address has none
+
+    Returns:
+        Tuple of (host, port)
+
+    Raises:
+        ValueError: If the address or port is malformed
+    """
+    if broker.startswith('['):
+        host, sep, rest = broker[1:].partition(']')
+        if not sep or not host or (rest and not rest.startswith(':')):
+            raise ValueError(f"Invalid broker address: {broker!r}")
+        port = rest[1:]
+    else:
+        host, sep, port = broker.rpartition(':')
+        if not sep:
+            host, port = broker, ''
+    if not port:
+        return host, default_port
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Invalid port in broker address: {broker!r}")
+    return host, int(port)
+
+
+def format_broker(host: str, port: int) -> str:
+    """Format a broker address, bracketing IPv6 hosts."""
+    return f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+
+
+class _Reader:
+    """Minimal big-endian reader for Kafka response payloads."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def _unpack(self, fmt: str):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def int8(self) -> int:
+        return self._unpack('>b')
+
+    def int16(self) -> int:
+        return self._unpack('>h')
+
+    def int32(self) -> int:
+        return self._unpack('>i')
+
+    def string(self) -> Optional[str]:
+        length = self.int16()
+        if length < 0:
+            return None
+        value = self.data[self.pos:self.pos + length].decode('utf-8')
+        self.pos += length
+        return value
+
+    def skip_nullable_string(self):
+        self.string()
+
+    def skip_int32_array(self):
+        count = self.int32()
+        self.pos += 4 * max(count, 0)
+
+
+def _encode_request(api_key: int, api_version: int, correlation_id: int, body: bytes = b'') -> bytes:
+    """Build a size-prefixed request with a v1 request header."""
+    header = struct.pack('>hhih', api_key, api_version, correlation_id, len(CLIENT_ID)) + CLIENT_ID
+    payload = header + body
+    return struct.pack('>i', len(payload)) + payload
+
+
+async def _round_trip(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                      request: bytes, correlation_id: int) -> _Reader:
+    """Send a request and return a reader positioned after the correlation id."""
+    writer.write(request)
+    await writer.drain()
+    size = struct.unpack('>i', await reader.readexactly(4))[0]
+    response = _Reader(await reader.readexactly(size))
+    if response.int32() != correlation_id:
+        raise ValueError("Correlation id mismatch in broker response")
+    return response
+
+
+def _parse_api_versions(response: _Reader) -> Dict[int, Tuple[int, int]]:
+    """Parse an ApiVersions v0 response into {api_key: (min, max)}."""
+    error_code = response.int16()
+    if error_code != 0:
+        raise ValueError(f"ApiVersions failed with error code {error_code}")
+    versions = {}
+    for _ in range(response.int32()):
+        api_key = response.int16()
+        versions[api_key] = (response.int16(), response.int16())
+    return versions
+
+
+def _choose_metadata_version(versions: Dict[int, Tuple[int, int]]) -> int:
+    """Pick the highest Metadata version supported by both the broker and this probe."""
+    min_version, max_version = versions.get(API_KEY_METADATA, (0, -1))
+    supported = [v for v in METADATA_VERSIONS if min_version <= v <= max_version]
+    if not supported:
+        raise ValueError(f"Broker supports Metadata v{min_version}-v{max_version}, "
+                         f"none of v{METADATA_VERSIONS[0]}-v{METADATA_VERSIONS[-1]}")
+    return supported[-1]
+
+
+def _encode_metadata_body(version: int) -> bytes:
+    """Metadata request body for all topics (null topic array)."""
+    body = struct.pack('>i', -1)
+    if version >= 4:
+        body += struct.pack('>b', 0)  # allow_auto_topic_creation
+    if version >= 8:
+        body += struct.pack('>bb', 0, 0)  # include cluster/topic authorized operations
+    return body
+
+
+def _parse_metadata(response: _Reader, version: int = 1) -> dict:
+    """Parse a Metadata v1-v8 response into broker/controller/topic counts."""
+    if version >= 3:
+        response.int32()  # throttle time
+    brokers = []
+    for _ in range(response.int32()):
+        node_id = response.int32()
+        host = response.string()
+        port = response.int32()
+        response.string()  # rack
+        brokers.append({'node_id': node_id, 'host': host, 'port': port})
+    if version >= 2:
+        response.skip_nullable_string()  # cluster id
+    controller_id = response.int32()
+
+    topics = 0
+    partitions = 0
+    for _ in range(response.int32()):
+        response.int16()  # error code
+        response.string()  # topic name
+        is_internal = response.int8()
+        partition_count = response.int32()
+        for _ in range(partition_count):
+            response.int16()  # error code
+            response.int32()  # partition index
+            response.int32()  # leader
+            if version >= 7:
+                response.int32()  # leader epoch
+            response.skip_int32_array()  # replicas
+            response.skip_int32_array()  # isr
+            if version >= 5:
+                response.skip_int32_array()  # offline replicas
+        if version >= 8:
+            response.int32()  # topic authorized operations
+        if not is_internal:
+            topics += 1
+            partitions += partition_count
+
+    return {
+        'brokers': brokers,
+        'controller_id': controller_id,
+        'topics': topics,
+        'partitions': partitions,
+    }
+
+
+async def probe_broker(host: str, port: int, timeout: float = 2.0) -> dict:
+    """
+    Connect to a broker and perform an ApiVersions + Metadata handshake.
+
+    Args:
+        host: Broker host
+        port: Broker port
+        timeout: Timeout in seconds for each of the connect and handshake phases
+
+    Returns:
+        Result dictionary with 'ok', latencies in milliseconds and cluster info
+    """
+    result = {
+        'broker': format_broker(host, port),
+        'ok': False,
+        'connect_ms': None,
+        'handshake_ms': None,
+        'api_versions': None,
+        'controller_id': None,
+        'brokers': None,
+        'topics': None,
+        'partitions': None,
+        'error': None,
+    }
+
+    writer = None
+    try:
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        connected = time.perf_counter()
+        result['connect_ms'] = round((connected - start) * 1000, 2)
+
+        async def handshake():
+            response = await _round_trip(reader, writer, _encode_request(API_KEY_API_VERSIONS, 0, 1), 1)
+            versions = _parse_api_versions(response)
+            version = _choose_metadata_version(versions)
+            response = await _round_trip(
+                reader, writer, _encode_request(API_KEY_METADATA, version, 2, _encode_metadata_body(version)), 2
+            )
+            return versions, _parse_metadata(response, version)
+
+        versions, metadata = await asyncio.wait_for(handshake(), timeout)
+        result['handshake_ms'] = round((time.perf_counter() - connected) * 1000, 2)
+        result['api_versions'] = len(versions)
+        result['controller_id'] = metadata['controller_id']
+        result['brokers'] = len(metadata['brokers'])
+        result['topics'] = metadata['topics']
+        result['partitions'] = metadata['partitions']
+        result['ok'] = True
+    except asyncio.TimeoutError:
+        phase = 'connect' if result['connect_ms'] is None else 'handshake'
+        result['error'] = f"{phase} timed out after {timeout}s"
+    except Exception as e:
+        result['error'] = str(e) or e.__class__.__name__
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    return result
+
+
+async def probe_brokers(brokers: List[Tuple[str, int]], timeout: float = 2.0) -> List[dict]:
+    """
+    Probe all brokers concurrently.
+
+    Args:
+        brokers: List of (host, port) tuples
+        timeout: Per-phase timeout in seconds
+
+    Returns:
+        List of result dictionaries, in the same order as brokers
+    """
+    return await asyncio.gather(*(probe_broker(host, port, timeout) for host, port in brokers))
+
+
+def format_human(results: List[dict]) -> str:
+    """Format probe results as human-readable lines."""
+    lines = []
+    for result in results:
+        if result['ok']:
+            lines.append(
+                f"✅ {result['broker']}: connect {result['connect_ms']} ms, "
+                f"handshake {result['handshake_ms']} ms, controller {result['controller_id']}, "
+                f"{result['brokers']} brokers, {result['topics']} topics, "
+                f"{result['partitions']} partitions"
+            )
+        else:
+            lines.append(f"❌ {result['broker']}: {result['error']}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Check that Kafka brokers are running and accessible.")
+    parser.add_argument('brokers', nargs='*', default=['localhost:9092'],
+                        help="Broker addresses as host[:port] (default: localhost:9092)")
+    parser.add_argument('--timeout', type=float, default=2.0,
+                        help="Connect and handshake timeout in seconds (default: 2)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    # Backwards compatible 'check_kafka.py HOST PORT' form
+    if len(args.brokers) == 2 and ':' not in args.brokers[0] and args.brokers[1].isdigit():
+        args.brokers = [f"{args.brokers[0]}:{args.brokers[1]}"]
+    return args
+
+
 def main():
     """Main function."""
-    host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9092
-    
-    print(f"Checking Kafka connection to {host}:{port}...")
-    
-    if check_kafka_port(host, port):
-        print(f"✅ Kafka is running and accessible on {host}:{port}")
-        sys.exit(0)
+    args = parse_args()
+    try:
+        brokers = [parse_broker(b) for b in args.brokers]
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+    if not args.json:
+        print(f"Checking Kafka connection to {', '.join(args.brokers)}...")
+
+    results = asyncio.run(probe_brokers(brokers, args.timeout))
+    all_ok = all(r['ok'] for r in results)
+
+    if args.json:
+        print(json.dumps({'ok': all_ok, 'brokers': results}, indent=2))
     else:
-        print(f"❌ Kafka is NOT accessible on {host}:{port}")
-        print("\nTo start Kafka:")
-        print("  - With Homebrew: brew services start kafka")
-        print("  - With Docker: docker-compose up -d")
-        print("  - Manually: Start Zookeeper first, then Kafka server")
-        sys.exit(1)
+        print(format_human(results))
+        if not all_ok:
+            print("\nTo start Kafka:")
+            print("  - With Homebrew: brew services start kafka")
+            print("  - With Docker: docker-compose up -d")
+            print("  - Manually: Start Zookeeper first, then Kafka server")
+
+    sys.exit(0 if all_ok else 1)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Exactly-once producer benchmark.
+
+Measures throughput and latency of the plain producer against the
+idempotent producer and transactional batches of different sizes, and
+reports each mode's cost relative to its baseline. Idempotence and
+transactions force acks=all, so they are compared with a plain producer
+using acks=all; that one is compared with the default acks=1 producer, so
+the cost of acks=all and the cost of exactly-once are reported separately.
+
+For plain and idempotent modes latency is per-message acknowledgement
+time. For transactional modes a message only becomes visible to
+read_committed consumers once its transaction commits, so latency is
+measured from the start of the transaction to its commit.
+
+Usage:
+    python3 eos_benchmark.py TOPIC [--bootstrap-servers HOST:PORT]
+        [--messages N] [--sizes 256] [--transaction-sizes 1,10,100,1000] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from kafka_manager import KafkaManager
+from payload_generator import PayloadGenerator, parse_size_distribution
+from producer_tuning import percentile
+from profiling import install_dump_signal
+
+
+# Mode each mode's throughput overhead is measured against
+BASELINES = {
+    'plain-acks-all': 'plain',
+    'idempotent': 'plain-acks-all',
+    'transactional': 'plain-acks-all',
+}
+
+
+async def measure_mode(bootstrap_servers: str, topic: str, mode: str, generator: PayloadGenerator,
+                       messages: int, transaction_size: int = 1, warmup: int = 100) -> Dict:
+    """
+    Measure one producer mode.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topic: Target topic
+        mode: 'plain' (acks=1), 'plain-acks-all', 'idempotent' or 'transactional'
+        generator: Source of message payloads
+        messages: Number of messages to measure
+        transaction_size: Messages per transaction in transactional mode
+        warmup: Number of messages sent before measuring
+
+    Returns:
+        Result dictionary with mode, transaction_size and metrics, or an 'error' entry
+    """
+    config = {
+        'plain': {'acks': 1},
+        'plain-acks-all': {'acks': 'all'},
+        'idempotent': {'enable_idempotence': True},
+        'transactional': {'transactional_id': f"eos-benchmark-{uuid.uuid4().hex}"},
+    }[mode]
+    result = {'mode': mode, 'transaction_size': transaction_size if mode == 'transactional' else None}
+    manager = KafkaManager(bootstrap_servers)
+    try:
+        if not await manager.connect_producer(**config):
+            result['error'] = "failed to connect producer"
+            return result
+        producer = manager.producer
+
+        def batch(count):
+            # Copy the pooled buffers: a transaction may outlive the pool cycle
+            return [(key, bytes(payload)) for key, payload in (generator.next() for _ in range(count))]
+
+        if mode == 'transactional':
+            if not await manager.send_transaction(topic, batch(min(warmup, transaction_size))):
+                result['error'] = "warmup transaction failed (is the broker configured for transactions?)"
+                return result
+        else:
+            for key, payload in batch(warmup):
+                await producer.send(topic, payload, key=key)
+            await producer.flush()
+
+        latencies: List[float] = []
+        total_bytes = 0
+        start = time.perf_counter()
+        if mode == 'transactional':
+            transactions = 0
+            for offset in range(0, messages, transaction_size):
+                pairs = batch(min(transaction_size, messages - offset))
+                total_bytes += sum(len(payload) for _, payload in pairs)
+                began = time.perf_counter()
+                if not await manager.send_transaction(topic, pairs):
+                    raise RuntimeError("transaction aborted")
+                latencies.append(time.perf_counter() - began)
+                transactions += 1
+            result['transactions'] = transactions
+        else:
+            futures = []
+            for key, payload in batch(messages):
+                total_bytes += len(payload)
+                sent_at = time.perf_counter()
+                future = await producer.send(topic, payload, key=key)
+                future.add_done_callback(
+                    lambda f, t=sent_at: latencies.append(time.perf_counter() - t)
+                )
+                futures.append(future)
+            await asyncio.gather(*futures)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        result.update({
+            'messages_per_sec': round(messages / elapsed, 1),
+            'mb_per_sec': round(total_bytes / elapsed / 1_000_000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        })
+    except Exception as e:
+        result['error'] = str(e) or e.__class__.__name__
+    finally:
+        await manager.close()
+    return result
+
+
+def add_overhead(results: List[Dict]) -> List[Dict]:
+    """
+    Add each result's throughput cost relative to its baseline mode (see BASELINES).
+
+    Args:
+        results: Measurement results
+
+    Returns:
+        The same results with 'baseline' and 'throughput_overhead_pct' set where
+        the baseline measurement succeeded
+    """
+    successful = {r['mode']: r for r in results if 'error' not in r and r['mode'] in BASELINES.values()}
+    for r in results:
+        baseline = successful.get(BASELINES.get(r['mode']))
+        if baseline and 'error' not in r:
+            r['baseline'] = baseline['mode']
+            r['throughput_overhead_pct'] = round(
+                (1 - r['messages_per_sec'] / baseline['messages_per_sec']) * 100, 1
+            )
+    return results
+
+
+async def benchmark(bootstrap_servers: str, topic: str, messages: int, sizes: str,
+                    transaction_sizes: List[int]) -> List[Dict]:
+    """
+    Run the plain, idempotent and transactional measurements one after another.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topic: Target topic
+        messages: Messages per measurement
+        sizes: Payload-size distribution
+        transaction_sizes: Messages per transaction to test
+
+    Returns:
+        Measurement results with overhead against the plain producer
+    """
+    generator = PayloadGenerator(sizes=parse_size_distribution(sizes))
+    runs = [('plain', 1), ('plain-acks-all', 1), ('idempotent', 1)] + [('transactional', size) for size in transaction_sizes]
+    results = []
+    for mode, transaction_size in runs:
+        result = await measure_mode(bootstrap_servers, topic, mode, generator, messages, transaction_size)
+        results.append(result)
+        label = f"{mode} x{transaction_size}" if mode == 'transactional' else mode
+        if 'error' in result:
+            print(f"{label}: error: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{label}: {result['messages_per_sec']} msg/s, p99 {result['p99_ms']} ms", file=sys.stderr)
+    return add_overhead(results)
+
+
+def format_table(results: List[Dict]) -> str:
+    """Format results as an aligned text table."""
+    lines = [f"{'mode':<14} {'txn size':>8} {'msg/s':>10} {'MB/s':>8} {'p50 ms':>9} {'p99 ms':>9} "
+             f"{'overhead':>9}  vs"]
+    for r in results:
+        size = r['transaction_size'] or '-'
+        if 'error' in r:
+            lines.append(f"{r['mode']:<14} {size:>8}  error: {r['error']}")
+            continue
+        overhead = f"{r['throughput_overhead_pct']}%" if 'throughput_overhead_pct' in r else '-'
+        lines.append(f"{r['mode']:<14} {size:>8} {r['messages_per_sec']:>10} {r['mb_per_sec']:>8} "
+                     f"{r['p50_ms']:>9} {r['p99_ms']:>9} {overhead:>9}  {r.get('baseline', '')}".rstrip())
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare plain (acks=1 and acks=all), idempotent and transactional producer "
+                    "throughput and latency."
+    )
+    parser.add_argument('topic', help="Target topic")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    parser.add_argument('--messages', type=int, default=20000, help="Messages per measurement")
+    parser.add_argument('--sizes', default='256', help="Payload-size distribution, e.g. 256:0.9,4096:0.1")
+    parser.add_argument('--transaction-sizes', default='1,10,100,1000',
+                        help="Comma-separated messages per transaction")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    install_dump_signal()
+    transaction_sizes = [int(s) for s in args.transaction_sizes.split(',') if s.strip()]
+    if any(size < 1 for size in transaction_sizes):
+        print("Transaction sizes must be at least 1")
+        sys.exit(1)
+
+    results = asyncio.run(benchmark(args.bootstrap_servers, args.topic, args.messages,
+                                    args.sizes, transaction_sizes))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_table(results))
+    if all('error' in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
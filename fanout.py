@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Fan-out producer: route or broadcast messages across several topics.
+
+Routing modes:
+    broadcast     every message goes to every topic
+    round-robin   messages cycle through the topic list
+    key-hash      a stable hash of the key picks the topic
+    field         a JSON field picks the topic, either through explicit
+                  'value=topic' routes or by hashing the field value
+
+All sends are queued on the manager's producer before any acknowledgement
+is awaited, so the destinations are written to concurrently and batched by
+the producer. Acknowledgements are aggregated per destination topic.
+
+Usage:
+    python3 fanout.py TOPIC1,TOPIC2 [--mode broadcast|round-robin|key-hash|field]
+        [--field '$.region' --routes EU=orders-eu,US=orders-us]
+        [--messages N] [--schema ...] [--sizes ...] [--keys N]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from kafka_manager import KafkaManager, serialize_key, serialize_value
+from message_filters import get_field
+from payload_generator import PayloadGenerator, parse_schema, parse_size_distribution
+from producer_tuning import percentile
+from profiling import PROFILER, install_dump_signal
+
+
+ROUTING_MODES = ['broadcast', 'round-robin', 'key-hash', 'field']
+
+
+def parse_routes(text: str) -> Dict[str, str]:
+    """
+    Parse field routes such as 'EU=orders-eu,US=orders-us'.
+
+    Args:
+        text: Comma-separated 'value=topic' entries
+
+    Returns:
+        Mapping of field value (as text) to topic
+    """
+    routes = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        value, sep, topic = part.partition('=')
+        if not sep or not topic.strip():
+            raise ValueError(f"Invalid route: {part!r}")
+        routes[value.strip()] = topic.strip()
+    return routes
+
+
+def _stable_hash(data: bytes) -> int:
+    """Process-independent hash, so a key always maps to the same topic."""
+    return zlib.crc32(data)
+
+
+class TopicRouter:
+    """Chooses the destination topics of each message."""
+
+    def __init__(self, topics: List[str], mode: str = 'broadcast', field: Optional[str] = None,
+                 routes: Optional[Dict[str, str]] = None):
+        """
+        Initialize the router.
+
+        Args:
+            topics: Destination topics
+            mode: One of ROUTING_MODES
+            field: JSON path of the routing field for 'field' mode
+            routes: Optional mapping of field value to topic for 'field' mode;
+                values without a route are hashed across topics
+        """
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode: {mode}")
+        if mode == 'field' and not field:
+            raise ValueError("Field routing needs a field, e.g. $.region")
+        self.routes = routes or {}
+        self.topics = list(topics) or list(dict.fromkeys(self.routes.values()))
+        if not self.topics:
+            raise ValueError("At least one destination topic is required")
+        self.mode = mode
+        self.field = field
+        self._round_robin = itertools.cycle(self.topics)
+
+    @classmethod
+    def parse(cls, topics_text: str, mode: str = 'broadcast', field_spec: str = '') -> Optional['TopicRouter']:
+        """
+        Build a router from UI inputs.
+
+        Args:
+            topics_text: Comma-separated destination topics
+            mode: One of ROUTING_MODES
+            field_spec: Routing field for 'field' mode, optionally followed by routes,
+                e.g. '$.region' or '$.region:EU=orders-eu,US=orders-us'
+
+        Returns:
+            The router, or None for a plain single-topic send
+
+        Raises:
+            ValueError: If the inputs are invalid
+        """
+        topics = [t.strip() for t in topics_text.split(',') if t.strip()]
+        field, routes = None, {}
+        if mode == 'field':
+            field, _, routes_text = field_spec.strip().partition(':')
+            routes = parse_routes(routes_text)
+        router = cls(topics, mode, field=field or None, routes=routes)
+        return router if len(router.destinations) > 1 else None
+
+    @property
+    def destinations(self) -> List[str]:
+        """Every topic this router can send to."""
+        return list(dict.fromkeys(self.topics + list(self.routes.values())))
+
+    def route(self, key, value) -> List[str]:
+        """
+        Return the destination topics of a message.
+
+        Args:
+            key: Message key (str, bytes or None)
+            value: Message value
+
+        Returns:
+            List of topics
+        """
+        if self.mode == 'broadcast':
+            return self.topics
+        if self.mode == 'round-robin':
+            return [next(self._round_robin)]
+        if self.mode == 'key-hash':
+            if not key:
+                # Unkeyed messages have nothing to hash; spread them instead
+                return [next(self._round_robin)]
+            return [self.topics[_stable_hash(serialize_key(key)) % len(self.topics)]]
+
+        field = get_field(value, self.field)
+        text = field if isinstance(field, str) else json.dumps(field)
+        topic = self.routes.get(text)
+        if topic is None:
+            topic = self.topics[_stable_hash(text.encode('utf-8')) % len(self.topics)]
+        return [topic]
+
+
+async def fan_out(manager: KafkaManager, router: TopicRouter,
+                  messages: Iterable[Tuple[Optional[str], object]]) -> Dict:
+    """
+    Send messages to their routed topics concurrently and wait for every acknowledgement.
+
+    Args:
+        manager: Kafka manager whose producer (and loop) is used
+        router: Topic router
+        messages: Iterable of (key, value) pairs
+
+    Returns:
+        Report with messages, sends, acked, failed, elapsed_sec, messages_per_sec and
+        per-destination 'destinations' stats (sent, acked, failed, messages_per_sec,
+        p50_ms, p99_ms, last error)
+    """
+    if not manager.producer:
+        if not await manager.connect_producer():
+            raise RuntimeError("Failed to connect producer")
+    producer = manager.producer
+
+    stats = {
+        topic: {'sent': 0, 'acked': 0, 'failed': 0, 'latencies': [], 'last_ack': None, 'error': None}
+        for topic in router.destinations
+    }
+
+    def on_delivery(future, topic, sent_at):
+        entry = stats[topic]
+        if future.cancelled() or future.exception() is not None:
+            entry['failed'] += 1
+            entry['error'] = 'cancelled' if future.cancelled() else str(future.exception())
+        else:
+            now = time.perf_counter()
+            entry['acked'] += 1
+            entry['last_ack'] = now
+            entry['latencies'].append(now - sent_at)
+
+    count = 0
+    futures = []
+    start = time.perf_counter()
+    for key, value in messages:
+        count += 1
+        topics = router.route(key, value)
+        # Serialize once, outside the send stage, even when broadcasting
+        value = serialize_value(value)
+        for topic in topics:
+            entry = stats[topic]
+            entry['sent'] += 1
+            token = PROFILER.begin('produce;fanout;send') if PROFILER.enabled else 0
+            sent_at = time.perf_counter()
+            try:
+                # send() only appends to a batch; the ack future resolves later
+                future = await producer.send(topic, value=value, key=key)
+            except Exception as e:
+                entry['failed'] += 1
+                entry['error'] = str(e) or e.__class__.__name__
+                continue
+            finally:
+                if token:
+                    PROFILER.end('produce;fanout;send', token)
+            future.add_done_callback(lambda f, t=topic, s=sent_at: on_delivery(f, t, s))
+            futures.append(future)
+    await asyncio.gather(*futures, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    destinations = {}
+    for topic, entry in stats.items():
+        latencies = sorted(entry['latencies'])
+        topic_elapsed = (entry['last_ack'] - start) if entry['last_ack'] else elapsed
+        destinations[topic] = {
+            'sent': entry['sent'],
+            'acked': entry['acked'],
+            'failed': entry['failed'],
+            'messages_per_sec': round(entry['acked'] / topic_elapsed, 1) if topic_elapsed > 0 else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'error': entry['error'],
+        }
+
+    acked = sum(d['acked'] for d in destinations.values())
+    return {
+        'messages': count,
+        'sends': sum(d['sent'] for d in destinations.values()),
+        'acked': acked,
+        'failed': sum(d['failed'] for d in destinations.values()),
+        'elapsed_sec': round(elapsed, 3),
+        'messages_per_sec': round(acked / elapsed, 1) if elapsed > 0 else 0.0,
+        'destinations': destinations,
+    }
+
+
+def format_report(report: Dict) -> str:
+    """Format a fan_out() report as text, one line per destination."""
+    lines = [f"{report['messages']} messages -> {report['sends']} sends: {report['acked']} acked, "
+             f"{report['failed']} failed in {report['elapsed_sec']}s ({report['messages_per_sec']} acks/s)"]
+    for topic, d in sorted(report['destinations'].items()):
+        line = (f"  {topic}: {d['acked']}/{d['sent']} acked, {d['messages_per_sec']} msg/s, "
+                f"p50 {d['p50_ms']} ms, p99 {d['p99_ms']} ms")
+        if d['failed']:
+            line += f", {d['failed']} failed ({d['error']})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Fan generated payloads out to several topics.")
+    parser.add_argument('topics', help="Comma-separated destination topics")
+    parser.add_argument('--mode', choices=ROUTING_MODES, default='broadcast')
+    parser.add_argument('--field', help="JSON path of the routing field for --mode field, e.g. '$.region'")
+    parser.add_argument('--routes', default='', help="Field routes, e.g. EU=orders-eu,US=orders-us")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--schema', default='message=str:16', help="e.g. region=str:2,amount=float")
+    parser.add_argument('--sizes', default='256', help="Payload-size distribution, e.g. 256:0.9,4096:0.1")
+    parser.add_argument('--keys', type=int, default=100, help="Number of distinct keys (0 for none)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    """Run a fan-out load from the command line arguments."""
+    router = TopicRouter([t.strip() for t in args.topics.split(',') if t.strip()], args.mode,
+                         field=args.field, routes=parse_routes(args.routes))
+    generator = PayloadGenerator(schema=parse_schema(args.schema),
+                                 sizes=parse_size_distribution(args.sizes), num_keys=args.keys)
+
+    def messages():
+        for _ in range(args.messages):
+            key, payload = generator.next()
+            # Field routing needs the decoded document; other modes send the buffer as-is
+            if router.mode == 'field':
+                yield key, json.loads(payload)
+            else:
+                yield key, bytes(payload)
+
+    manager = KafkaManager(args.bootstrap_servers)
+    try:
+        return await fan_out(manager, router, messages())
+    finally:
+        await manager.close()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    install_dump_signal()
+    try:
+        report = asyncio.run(run(args))
+    except Exception as e:
+        print(f"Error running fan-out: {e}")
+        sys.exit(1)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    if PROFILER.enabled:
+        print(PROFILER.format_breakdown())
+    sys.exit(1 if report['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,32 @@ GUI application for Kafka queue visualization.
 """
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import threading
 import json
+import uuid
 from datetime import datetime
-from typing import Optional
-from kafka_manager import KafkaManager
+from typing import TYPE_CHECKING, Optional
+from kafka_manager import (
+    KafkaManager, ConsumerSession, START_MODES, STOP_MODES, consumer_position_options
+)
+from profiling import PROFILER
+from message_filters import MessageFilter
+from fanout import ROUTING_MODES, TopicRouter, fan_out, format_report
+from stream_aggregation import WindowedAggregator, aggregating_callback
+from sequence_checker import SequenceChecker, checking_callback
+
+if TYPE_CHECKING:
+    from shm_consumer import ProcessConsumer
 
 
 class KafkaGUI:
     """Main GUI application for Kafka testing."""
     
+    # Shared-memory consumer polling interval and max lines drained per tick
+    PROCESS_POLL_MS = 100
+    PROCESS_POLL_LINES = 2000
+    # Oldest log lines are dropped beyond this to keep memory bounded
+    MAX_LOG_LINES = 5000
+    
     def __init__(self, root):
         """
         Initialize the GUI.
@@ -26,7 +42,13 @@ class KafkaGUI:
         
         self.kafka_manager: Optional[KafkaManager] = None
         self.consuming = False
-        self.consumer_thread: Optional[threading.Thread] = None
+        self.closing = False
+        self.consumer_session: Optional[ConsumerSession] = None
+        self.process_consumer: Optional['ProcessConsumer'] = None
+        self.sequence_checker: Optional[SequenceChecker] = None
+        # Test messages carry a per-key sequence that keeps counting across clicks
+        self.producer_id = uuid.uuid4().hex
+        self.key_sequences = {}
         
         self.setup_ui()
         self.root.update_idletasks()
@@ -73,7 +95,7 @@ class KafkaGUI:
         producer_inner = ttk.Frame(producer_frame)
         producer_inner.pack(fill=tk.X)
         
-        ttk.Label(producer_inner, text="Topic:").grid(row=0, column=0, padx=5, pady=5)
+        ttk.Label(producer_inner, text="Topic(s):").grid(row=0, column=0, padx=5, pady=5)
         self.producer_topic_entry = ttk.Entry(producer_inner, width=20)
         self.producer_topic_entry.insert(0, "test-topic")
         self.producer_topic_entry.grid(row=0, column=1, padx=5, pady=5)
@@ -82,6 +104,16 @@ class KafkaGUI:
         self.key_entry = ttk.Entry(producer_inner, width=20)
         self.key_entry.grid(row=0, column=3, padx=5, pady=5)
         
+        ttk.Label(producer_inner, text="Routing:").grid(row=0, column=4, padx=5, pady=5)
+        self.routing_mode_combo = ttk.Combobox(producer_inner, values=ROUTING_MODES, state="readonly", width=11)
+        self.routing_mode_combo.set(ROUTING_MODES[0])
+        self.routing_mode_combo.grid(row=0, column=5, padx=5, pady=5)
+        ttk.Label(producer_inner, text="Route field:").grid(row=0, column=6, padx=5, pady=5)
+        self.route_field_entry = ttk.Entry(producer_inner, width=30)
+        self.route_field_entry.grid(row=0, column=7, padx=5, pady=5)
+        ttk.Label(producer_inner, text="(several topics fan out; field: $.region or $.region:EU=orders-eu,US=orders-us)").grid(
+            row=1, column=4, columnspan=4, padx=5, pady=5, sticky=tk.NW)
+        
         ttk.Label(producer_inner, text="Message:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.N)
         self.message_text = scrolledtext.ScrolledText(producer_inner, width=50, height=5)
         self.message_text.insert("1.0", '{"message": "Hello Kafka", "timestamp": ""}')
@@ -108,6 +140,59 @@ class KafkaGUI:
         self.stop_consumer_btn = ttk.Button(consumer_inner, text="Stop Consumer", command=self.stop_consumer, state=tk.DISABLED)
         self.stop_consumer_btn.grid(row=0, column=3, padx=5, pady=5)
         
+        self.process_mode_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(consumer_inner, text="Run in separate process",
+                        variable=self.process_mode_var).grid(row=0, column=4, padx=5, pady=5)
+        
+        self.check_sequences_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(consumer_inner, text="Check sequences",
+                        variable=self.check_sequences_var).grid(row=0, column=5, padx=5, pady=5)
+        
+        position_inner = ttk.Frame(consumer_frame)
+        position_inner.pack(fill=tk.X)
+        
+        ttk.Label(position_inner, text="Start from:").grid(row=0, column=0, padx=5, pady=5)
+        self.start_mode_combo = ttk.Combobox(position_inner, values=START_MODES, state="readonly", width=10)
+        self.start_mode_combo.set(START_MODES[0])
+        self.start_mode_combo.grid(row=0, column=1, padx=5, pady=5)
+        self.start_value_entry = ttk.Entry(position_inner, width=25)
+        self.start_value_entry.grid(row=0, column=2, padx=5, pady=5)
+        
+        ttk.Label(position_inner, text="Stop at:").grid(row=0, column=3, padx=5, pady=5)
+        self.stop_mode_combo = ttk.Combobox(position_inner, values=STOP_MODES, state="readonly", width=10)
+        self.stop_mode_combo.set(STOP_MODES[0])
+        self.stop_mode_combo.grid(row=0, column=4, padx=5, pady=5)
+        self.stop_value_entry = ttk.Entry(position_inner, width=25)
+        self.stop_value_entry.grid(row=0, column=5, padx=5, pady=5)
+        
+        ttk.Label(position_inner, text="(offsets: 0:100,1:250 | N | ISO time or epoch ms)").grid(
+            row=0, column=6, padx=5, pady=5)
+        
+        ttk.Label(position_inner, text="Filter:").grid(row=1, column=0, padx=5, pady=5)
+        self.filter_entry = ttk.Entry(position_inner, width=60)
+        self.filter_entry.grid(row=1, column=1, columnspan=5, padx=5, pady=5, sticky=tk.W + tk.E)
+        ttk.Label(position_inner, text="(e.g. key^=user-; partition=0,2; contains=ERROR; $.amount>100)").grid(
+            row=1, column=6, padx=5, pady=5)
+        
+        ttk.Label(position_inner, text="Aggregate field:").grid(row=2, column=0, padx=5, pady=5)
+        self.aggregate_field_entry = ttk.Entry(position_inner, width=25)
+        self.aggregate_field_entry.grid(row=2, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W + tk.E)
+        ttk.Label(position_inner, text="Group by:").grid(row=2, column=3, padx=5, pady=5)
+        self.aggregate_group_entry = ttk.Entry(position_inner, width=12)
+        self.aggregate_group_entry.insert(0, "key")
+        self.aggregate_group_entry.grid(row=2, column=4, padx=5, pady=5)
+        window_inner = ttk.Frame(position_inner)
+        window_inner.grid(row=2, column=5, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(window_inner, text="Window s:").pack(side=tk.LEFT)
+        self.aggregate_window_entry = ttk.Entry(window_inner, width=6)
+        self.aggregate_window_entry.insert(0, "10")
+        self.aggregate_window_entry.pack(side=tk.LEFT, padx=2)
+        ttk.Label(window_inner, text="Slide s:").pack(side=tk.LEFT)
+        self.aggregate_slide_entry = ttk.Entry(window_inner, width=6)
+        self.aggregate_slide_entry.pack(side=tk.LEFT, padx=2)
+        ttk.Label(position_inner, text="(e.g. $.amount grouped by key or $.region; empty slide = tumbling)").grid(
+            row=2, column=6, padx=5, pady=5)
+        
         # Messages display frame
         messages_frame = ttk.LabelFrame(self.root, text="Messages Log", padding=10)
         messages_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -120,6 +205,11 @@ class KafkaGUI:
         self.stats_label.pack(side=tk.LEFT)
         
         ttk.Button(stats_frame, text="Clear Log", command=self.clear_log).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(stats_frame, text="Dump Profile", command=self.dump_profile).pack(side=tk.RIGHT, padx=5)
+        
+        self.profile_var = tk.BooleanVar(value=PROFILER.enabled)
+        ttk.Checkbutton(stats_frame, text="Profile stages", variable=self.profile_var,
+                        command=self.toggle_profiling).pack(side=tk.RIGHT, padx=5)
         
         self.messages_text = scrolledtext.ScrolledText(messages_frame, width=100, height=25)
         self.messages_text.pack(fill=tk.BOTH, expand=True)
@@ -184,6 +274,10 @@ class KafkaGUI:
             messagebox.showerror("Error", "Please enter a topic name")
             return
         
+        router = self.build_router()
+        if router is False:
+            return
+        
         message_text = self.message_text.get("1.0", tk.END).strip()
         if not message_text:
             messagebox.showerror("Error", "Please enter a message")
@@ -195,6 +289,16 @@ class KafkaGUI:
             
             key = self.key_entry.get().strip() or None
             
+            if router:
+                report = self.kafka_manager.run_async(fan_out(self.kafka_manager, router, [(key, message)]))
+                self.messages_sent += report['acked']
+                self.update_stats()
+                sent_to = [t for t, d in report['destinations'].items() if d['sent']]
+                self.log_message("PRODUCER", f"Sent to {', '.join(sent_to)}: {json.dumps(message)}")
+                if report['failed']:
+                    messagebox.showerror("Error", format_report(report))
+                return
+            
             success = self.kafka_manager.run_async(
                 self.kafka_manager.send_message(topic, message, key)
             )
@@ -220,15 +324,27 @@ class KafkaGUI:
             messagebox.showerror("Error", "Please enter a topic name")
             return
         
+        router = self.build_router()
+        if router is False:
+            return
+        
+        messages = self.build_test_messages(10)
+        
+        if router:
+            try:
+                # Fan-out sends concurrently on the producer's own loop
+                report = self.kafka_manager.run_async(fan_out(self.kafka_manager, router, messages))
+            except Exception as e:
+                messagebox.showerror("Error", f"Error sending messages: {e}")
+                return
+            self.messages_sent += report['acked']
+            self.update_stats()
+            self.log_lines("PRODUCER", format_report(report).splitlines())
+            return
+        
         async def send_all():
-            for i in range(10):
-                message = {
-                    "message": f"Test message {i+1}",
-                    "sequence": i+1,
-                    "timestamp": datetime.now().isoformat()
-                }
-                key = f"key-{i % 3}"  # Cycle through 3 keys
-                
+            for key, message in messages:
+                message["timestamp"] = datetime.now().isoformat()
                 success = await self.kafka_manager.send_message(topic, message, key)
                 if success:
                     self.messages_sent += 1
@@ -242,6 +358,44 @@ class KafkaGUI:
         except Exception as e:
             messagebox.showerror("Error", f"Error sending messages: {e}")
     
+    def build_test_messages(self, count: int):
+        """
+        Build test messages cycling through 3 keys, each with its own sequence.
+        
+        Args:
+            count: Number of messages
+        
+        Returns:
+            List of (key, message) pairs
+        """
+        messages = []
+        for i in range(count):
+            key = f"key-{i % 3}"
+            sequence = self.key_sequences.get(key, 0) + 1
+            self.key_sequences[key] = sequence
+            messages.append((key, {
+                "message": f"Test message {sequence}",
+                "producer_id": self.producer_id,
+                "sequence": sequence,
+                "timestamp": datetime.now().isoformat()
+            }))
+        return messages
+    
+    def build_router(self):
+        """
+        Build a topic router from the producer topic and routing fields.
+        
+        Returns:
+            The router, None for a plain single-topic send, or False if the
+            inputs are invalid (an error has been shown)
+        """
+        try:
+            return TopicRouter.parse(self.producer_topic_entry.get(), self.routing_mode_combo.get(),
+                                     self.route_field_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid routing: {e}")
+            return False
+    
     def start_consumer(self):
         """Start consuming messages from Kafka."""
         if not self.kafka_manager:
@@ -259,43 +413,190 @@ class KafkaGUI:
         
         topics = [t.strip() for t in topics_str.split(",")]
         
-        async def start_consume():
-            success = await self.kafka_manager.connect_consumer(topics)
-            if success:
-                self.consuming = True
-                self.root.after(0, lambda: self.start_consumer_btn.config(state=tk.DISABLED))
-                self.root.after(0, lambda: self.stop_consumer_btn.config(state=tk.NORMAL))
-                self.root.after(0, self.log_message, "SYSTEM", 
-                             f"Started consuming from topics: {', '.join(topics)}")
-                
-                # Start consuming loop
-                def message_callback(topic, partition, offset, key, value):
-                    if self.consuming:
-                        self.messages_received += 1
-                        self.root.after(0, self.log_message, "CONSUMER", 
-                                      f"[{topic}:{partition}:{offset}] Key: {key}, Value: {json.dumps(value)}")
-                        self.root.after(0, self.update_stats)
-                
-                def should_continue():
-                    return self.consuming
-                
-                try:
-                    await self.kafka_manager.consume_messages(message_callback, should_continue=should_continue)
-                except Exception as e:
-                    if self.consuming:
-                        self.root.after(0, lambda: self.log_message("ERROR", f"Consumer error: {e}"))
-                        self.root.after(0, self.stop_consumer)
-            else:
-                self.root.after(0, messagebox.showerror, "Error", "Failed to start consumer")
+        try:
+            position_options = consumer_position_options(
+                self.start_mode_combo.get(), self.start_value_entry.get(),
+                self.stop_mode_combo.get(), self.stop_value_entry.get()
+            )
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid start/stop position: {e}")
+            return
+        
+        filter_spec = self.filter_entry.get().strip()
+        try:
+            message_filter = MessageFilter.parse(filter_spec)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid filter: {e}")
+            return
+        
+        try:
+            aggregator = self.build_aggregator()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid aggregation: {e}")
+            return
+        
+        if self.check_sequences_var.get() and message_filter and not message_filter.keeps_whole_keys():
+            messagebox.showerror("Error", "Sequence checks need every message of a key: remove "
+                                          "contains= and $. terms from the filter")
+            return
+        
+        if self.process_mode_var.get():
+            if aggregator is not None or self.check_sequences_var.get():
+                messagebox.showerror("Error", "Aggregation and sequence checks are not available "
+                                              "in separate-process mode")
+                return
+            self.start_process_consumer(topics, position_options, filter_spec)
+            return
+        
+        def message_callback(topic, partition, offset, key, value):
+            if self.consuming:
+                self.messages_received += 1
+                self.root.after(0, self.log_message, "CONSUMER", 
+                              f"[{topic}:{partition}:{offset}] Key: {key}, Value: {json.dumps(value)}")
+                self.root.after(0, self.update_stats)
+        
+        def on_results(results):
+            self.root.after(0, self.log_lines, "AGGREGATE", [aggregator.format_result(r) for r in results])
+        
+        callback = message_callback
+        if aggregator is not None:
+            callback = aggregating_callback(aggregator, on_results, message_callback)
+        
+        def close_idle_windows():
+            # Close windows on processing time while the topics are idle
+            results = aggregator.advance()
+            if results:
+                on_results(results)
+        
+        on_poll = close_idle_windows if aggregator is not None else None
+        
+        self.sequence_checker = SequenceChecker() if self.check_sequences_var.get() else None
+        if self.sequence_checker is not None:
+            def on_anomaly(event, description):
+                self.root.after(0, self.log_message, "SEQUENCE", description)
+            
+            callback = checking_callback(self.sequence_checker, on_anomaly, callback)
+        
+        def on_finished(error):
+            # Runs on the session thread once the consumer is closed
+            if self.closing:
+                return
+            if aggregator is not None:
+                results = aggregator.flush()
+                if results:
+                    on_results(results)
+            if error is not None:
+                self.root.after(0, self.log_message, "ERROR", f"Consumer error: {error}")
+            self.root.after(0, self.consumer_finished)
         
         try:
-            self.kafka_manager.run_async_in_thread(start_consume())
+            self.consumer_session = ConsumerSession(
+                self.kafka_manager, topics, callback, on_finished=on_finished,
+                message_filter=message_filter, on_poll=on_poll, **position_options
+            ).start()
         except Exception as e:
             messagebox.showerror("Error", f"Error starting consumer: {e}")
+            return
+        
+        self.consuming = True
+        self.start_consumer_btn.config(state=tk.DISABLED)
+        self.stop_consumer_btn.config(state=tk.NORMAL)
+        self.log_message("SYSTEM", f"Started consuming from topics: {', '.join(topics)}")
+    
+    def build_aggregator(self) -> Optional[WindowedAggregator]:
+        """
+        Build a windowed aggregator from the aggregation fields.
+        
+        Returns:
+            The aggregator, or None if no aggregate field is set
+        
+        Raises:
+            ValueError: If the window settings are invalid
+        """
+        field = self.aggregate_field_entry.get().strip()
+        if not field:
+            return None
+        group_by = self.aggregate_group_entry.get().strip()
+        slide = self.aggregate_slide_entry.get().strip()
+        return WindowedAggregator(
+            field,
+            window_sec=float(self.aggregate_window_entry.get().strip() or 10),
+            slide_sec=float(slide) if slide else None,
+            group_by=group_by if group_by and group_by != 'none' else None,
+        )
+    
+    def start_process_consumer(self, topics, position_options, filter_spec=''):
+        """
+        Start consuming in a child process that feeds the log over shared memory.
+        
+        Args:
+            topics: List of topics to consume from
+            position_options: Start/stop options for connect_consumer()
+            filter_spec: Optional message filter spec
+        """
+        try:
+            # Imported here: shared memory needs Python 3.8+, the rest of the GUI does not
+            from shm_consumer import ProcessConsumer
+        except ImportError:
+            messagebox.showerror("Error", "A separate consumer process requires Python 3.8+")
+            return
+        try:
+            self.process_consumer = ProcessConsumer(
+                self.kafka_manager.bootstrap_servers, topics, filter_spec=filter_spec, **position_options
+            ).start()
+        except Exception as e:
+            messagebox.showerror("Error", f"Error starting consumer process: {e}")
+            return
+        
+        self.consuming = True
+        self.start_consumer_btn.config(state=tk.DISABLED)
+        self.stop_consumer_btn.config(state=tk.NORMAL)
+        self.log_message("SYSTEM", f"Started consumer process for topics: {', '.join(topics)}")
+        self.root.after(self.PROCESS_POLL_MS, self.poll_process_consumer)
+    
+    def poll_process_consumer(self):
+        """Drain new lines from the consumer process into the log (Tk timer)."""
+        consumer = self.process_consumer
+        if consumer is None:
+            return
+        
+        alive = consumer.running
+        lines, stats = consumer.poll(limit=self.PROCESS_POLL_LINES)
+        if lines:
+            self.log_lines("CONSUMER", lines)
+        self.messages_received = stats['messages']
+        self.update_stats()
+        
+        if alive or lines:
+            self.root.after(self.PROCESS_POLL_MS, self.poll_process_consumer)
+            return
+        
+        from shm_consumer import STATE_FAILED
+        if stats['state'] == STATE_FAILED:
+            self.log_message("ERROR", "Consumer process failed")
+        if stats['dropped']:
+            self.log_message("SYSTEM", f"{stats['dropped']} lines were dropped while the log fell behind")
+        consumer.close()
+        self.process_consumer = None
+        self.consumer_finished()
     
     def stop_consumer(self):
         """Stop consuming messages."""
         self.consuming = False
+        self.stop_consumer_btn.config(state=tk.DISABLED)
+        if self.process_consumer:
+            # poll_process_consumer finishes up once the child has exited
+            self.process_consumer.stop(timeout=0)
+            self.log_message("SYSTEM", "Stopping consumer...")
+        elif self.consumer_session:
+            # Don't block the Tk thread; consumer_finished runs once the session has closed
+            self.consumer_session.stop(timeout=0)
+            self.log_message("SYSTEM", "Stopping consumer...")
+    
+    def consumer_finished(self):
+        """Reset consumer state after the session has closed its consumer."""
+        self.consuming = False
+        self.consumer_session = None
         self.start_consumer_btn.config(state=tk.NORMAL)
         self.stop_consumer_btn.config(state=tk.DISABLED)
         self.log_message("SYSTEM", "Stopped consumer")
@@ -308,15 +609,64 @@ class KafkaGUI:
             source: Source of the message (PRODUCER, CONSUMER, SYSTEM, ERROR)
             message: Message content
         """
+        token = PROFILER.begin('ui;render') if PROFILER.enabled else 0
         timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
         log_entry = f"[{timestamp}] [{source}] {message}\n"
         
         self.messages_text.insert(tk.END, log_entry)
+        self.trim_log()
         self.messages_text.see(tk.END)
+        if token:
+            PROFILER.end('ui;render', token)
+    
+    def log_lines(self, source: str, lines):
+        """
+        Log several messages with a single widget update.
+        
+        Args:
+            source: Source of the messages
+            lines: Message contents
+        """
+        token = PROFILER.begin('ui;render') if PROFILER.enabled else 0
+        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        self.messages_text.insert(tk.END, "".join(f"[{timestamp}] [{source}] {line}\n" for line in lines))
+        self.trim_log()
+        self.messages_text.see(tk.END)
+        if token:
+            PROFILER.end('ui;render', token)
+    
+    def trim_log(self):
+        """Drop the oldest lines once the log exceeds MAX_LOG_LINES."""
+        lines = int(self.messages_text.index("end-1c").split(".")[0])
+        if lines > self.MAX_LOG_LINES:
+            self.messages_text.delete("1.0", f"{lines - self.MAX_LOG_LINES + 1}.0")
     
     def update_stats(self):
         """Update statistics display."""
-        self.stats_label.config(text=f"Messages received: {self.messages_received} | Messages sent: {self.messages_sent}")
+        text = f"Messages received: {self.messages_received} | Messages sent: {self.messages_sent}"
+        if self.sequence_checker is not None:
+            text += f" | {self.sequence_checker.format_metrics()}"
+        self.stats_label.config(text=text)
+    
+    def toggle_profiling(self):
+        """Enable or disable stage profiling."""
+        if self.profile_var.get():
+            PROFILER.reset()
+            PROFILER.enable()
+            self.log_message("SYSTEM", "Stage profiling enabled")
+        else:
+            PROFILER.disable()
+            self.log_message("SYSTEM", "Stage profiling disabled")
+    
+    def dump_profile(self):
+        """Write the collapsed-stack profile to disk and log the stage breakdown."""
+        path = f"kafka-profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+        try:
+            PROFILER.dump(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Error writing profile: {e}")
+            return
+        self.log_message("SYSTEM", f"Profile written to {path}\n{PROFILER.format_breakdown()}")
     
     def clear_log(self):
         """Clear the messages log."""
@@ -324,8 +674,14 @@ class KafkaGUI:
     
     def on_closing(self):
         """Handle window closing."""
+        self.closing = True
+        self.consuming = False
+        if self.consumer_session:
+            self.consumer_session.stop()
+        if self.process_consumer:
+            self.process_consumer.stop()
+            self.process_consumer.close()
         if self.kafka_manager:
-            self.consuming = False
             self.kafka_manager.run_async(self.kafka_manager.close())
         self.root.destroy()
 
@@ -1,16 +1,175 @@
 """
 Kafka manager for handling producer and consumer operations using aiokafka (async).
 """
-from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer, TopicPartition
 from aiokafka.admin import AIOKafkaAdminClient, NewTopic
 import json
 import asyncio
-from typing import Optional, Callable, List
+import threading
+from datetime import datetime
+from typing import Optional, Callable, List, Dict, Union
+from profiling import PROFILER
+from message_filters import MessageFilter
+
+# Offsets keyed by partition (all topics) or by (topic, partition)
+PartitionOffsets = Dict[Union[int, tuple], int]
+
+START_MODES = ['earliest', 'latest', 'last N', 'offsets', 'timestamp']
+STOP_MODES = ['none', 'offsets', 'timestamp']
+
+
+def serialize_value(value, stage: str = 'produce;serialize') -> bytes:
+    """
+    Serialize a message value for the producer.
+    
+    Pre-encoded bytes are sent as-is, anything else is encoded as JSON.
+    Senders serialize before their timed send stage and pass the bytes on,
+    so serialization is not counted inside the broker wait.
+    
+    Args:
+        value: Message value
+        stage: Profiling stage, nested under the caller's stage when the
+            caller cannot serialize outside it
+        
+    Returns:
+        Encoded message bytes
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return value
+    token = PROFILER.begin(stage) if PROFILER.enabled else 0
+    data = json.dumps(value).encode('utf-8')
+    if token:
+        PROFILER.end(stage, token)
+    return data
+
+
+def deserialize_value(data: bytes):
+    """
+    Deserialize a consumed JSON message value.
+    
+    Args:
+        data: Raw message bytes
+        
+    Returns:
+        Decoded message value
+    """
+    token = PROFILER.begin('consume;deserialize') if PROFILER.enabled else 0
+    value = json.loads(data.decode('utf-8'))
+    if token:
+        PROFILER.end('consume;deserialize', token)
+    return value
+
+
+def serialize_key(key) -> Optional[bytes]:
+    """
+    Serialize a message key for the producer.
+    
+    Args:
+        key: Message key as str or pre-encoded bytes
+        
+    Returns:
+        Encoded key bytes, or None for an empty key
+    """
+    if not key:
+        return None
+    if isinstance(key, (bytes, bytearray)):
+        return key
+    return key.encode('utf-8')
+
+
+def parse_partition_offsets(text: str) -> PartitionOffsets:
+    """
+    Parse per-partition offsets such as '0:100,1:250' or 'orders:0:100'.
+    
+    Args:
+        text: Comma-separated 'partition:offset' or 'topic:partition:offset' entries
+        
+    Returns:
+        Mapping of partition or (topic, partition) to offset
+    """
+    offsets = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        fields = part.rsplit(':', 2)
+        if len(fields) == 3:
+            offsets[(fields[0], int(fields[1]))] = int(fields[2])
+        elif len(fields) == 2:
+            offsets[int(fields[0])] = int(fields[1])
+        else:
+            raise ValueError(f"Invalid partition offset: {part!r}")
+    return offsets
+
+
+def parse_timestamp_ms(text: str) -> int:
+    """
+    Parse a wall-clock time as epoch milliseconds or an ISO 8601 datetime.
+    
+    Args:
+        text: '1700000000000' or '2024-01-31T12:00:00' (naive times are local)
+        
+    Returns:
+        Epoch milliseconds
+    """
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    return int(datetime.fromisoformat(text).timestamp() * 1000)
+
+
+def consumer_position_options(start_mode: str = 'earliest', start_value: str = '',
+                              stop_mode: str = 'none', stop_value: str = '') -> dict:
+    """
+    Translate UI start/stop selections into connect_consumer() keyword arguments.
+    
+    Args:
+        start_mode: One of START_MODES
+        start_value: Offsets, N or timestamp depending on start_mode
+        stop_mode: One of STOP_MODES
+        stop_value: Offsets or timestamp depending on stop_mode
+        
+    Returns:
+        Keyword arguments for connect_consumer()
+        
+    Raises:
+        ValueError: If a mode is unknown or its value cannot be parsed
+    """
+    options = {}
+    if start_mode == 'latest':
+        options['last_n'] = 0
+    elif start_mode == 'last N':
+        options['last_n'] = int(start_value)
+    elif start_mode == 'offsets':
+        options['start_offsets'] = parse_partition_offsets(start_value)
+    elif start_mode == 'timestamp':
+        options['start_timestamp_ms'] = parse_timestamp_ms(start_value)
+    elif start_mode != 'earliest':
+        raise ValueError(f"Unknown start mode: {start_mode}")
+    
+    if stop_mode == 'offsets':
+        options['stop_offsets'] = parse_partition_offsets(stop_value)
+    elif stop_mode == 'timestamp':
+        options['stop_timestamp_ms'] = parse_timestamp_ms(stop_value)
+    elif stop_mode != 'none':
+        raise ValueError(f"Unknown stop mode: {stop_mode}")
+    return options
+
+
+def _offset_for(offsets: PartitionOffsets, tp: TopicPartition) -> Optional[int]:
+    """Look up an offset by (topic, partition), falling back to partition only."""
+    if (tp.topic, tp.partition) in offsets:
+        return offsets[(tp.topic, tp.partition)]
+    return offsets.get(tp.partition)
 
 
 class KafkaManager:
     """Manages Kafka connections and operations using aiokafka (async/await)."""
     
+    # Client classes; subclasses may swap in stand-ins (e.g. an in-process broker)
+    producer_class = AIOKafkaProducer
+    consumer_class = AIOKafkaConsumer
+    
     def __init__(self, bootstrap_servers: str = 'localhost:9092'):
         """
         Initialize Kafka manager.
@@ -23,19 +182,34 @@ class KafkaManager:
         self.consumer: Optional[AIOKafkaConsumer] = None
         self.admin_client: Optional[AIOKafkaAdminClient] = None
         self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_offsets: Dict[TopicPartition, int] = {}
+        self._consumer_group: Optional[str] = None
         
-    async def connect_producer(self) -> bool:
+    async def connect_producer(self, enable_idempotence: bool = False,
+                               transactional_id: Optional[str] = None, **producer_config) -> bool:
         """
         Connect to Kafka as producer.
         
+        Args:
+            enable_idempotence: Let the broker drop duplicates of retried sends
+                (requires acks='all', which becomes the default)
+            transactional_id: Enable transactions for send_transaction() and
+                transform_messages(); implies idempotence
+            producer_config: Extra AIOKafkaProducer settings
+                (e.g. linger_ms, max_batch_size, compression_type, acks)
+        
         Returns:
             True if connection successful, False otherwise
         """
+        if transactional_id is not None:
+            producer_config['transactional_id'] = transactional_id
         try:
-            self.producer = AIOKafkaProducer(
+            self.producer = self.producer_class(
                 bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                key_serializer=lambda k: k.encode('utf-8') if k else None
+                value_serializer=serialize_value,
+                key_serializer=serialize_key,
+                enable_idempotence=enable_idempotence,
+                **producer_config
             )
             await self.producer.start()
             return True
@@ -43,33 +217,128 @@ class KafkaManager:
             print(f"Error connecting producer: {e}")
             return False
     
-    async def connect_consumer(self, topics: List[str], group_id: str = 'test-group') -> bool:
+    async def connect_consumer(self, topics: List[str], group_id: str = 'test-group',
+                               start_offsets: Optional[PartitionOffsets] = None,
+                               last_n: Optional[int] = None,
+                               start_timestamp_ms: Optional[int] = None,
+                               stop_offsets: Optional[PartitionOffsets] = None,
+                               stop_timestamp_ms: Optional[int] = None,
+                               isolation_level: str = 'read_uncommitted',
+                               enable_auto_commit: bool = True) -> bool:
         """
         Connect to Kafka as consumer.
         
+        Without position options the consumer joins group_id and resumes from
+        the committed offsets (or the earliest offset). With any start or stop
+        option it reads every partition of the topics without a group, so
+        targeted reads never move the group's committed offsets.
+        
         Args:
             topics: List of topics to consume from
             group_id: Consumer group ID
+            start_offsets: Start offset per partition; partitions not listed are not read
+            last_n: Start N messages before the end of each partition (0 = latest)
+            start_timestamp_ms: Start at the first message at or after this time
+            stop_offsets: Stop before this offset per partition
+            stop_timestamp_ms: Stop before the first message at or after this time
+            isolation_level: 'read_committed' to skip messages of aborted transactions
+            enable_auto_commit: False to leave offset commits to the caller (e.g. inside
+                transactions with transform_messages()); close_consumer() then commits nothing
             
         Returns:
             True if connection successful, False otherwise
         """
+        seeking = any(option is not None for option in (
+            start_offsets, last_n, start_timestamp_ms, stop_offsets, stop_timestamp_ms
+        ))
         try:
-            self.consumer = AIOKafkaConsumer(
+            self.consumer = self.consumer_class(
                 *topics,
                 bootstrap_servers=self.bootstrap_servers,
-                group_id=group_id,
-                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
-                key_deserializer=lambda k: k.decode('utf-8') if k else None,
+                group_id=None if seeking else group_id,
                 auto_offset_reset='earliest',
-                enable_auto_commit=True
+                enable_auto_commit=enable_auto_commit and not seeking,
+                isolation_level=isolation_level
             )
             await self.consumer.start()
+            self._consumer_group = None if seeking or not enable_auto_commit else group_id
+            self._stop_offsets = {}
+            if seeking:
+                await self._seek_consumer(start_offsets, last_n, start_timestamp_ms,
+                                          stop_offsets, stop_timestamp_ms)
             return True
         except Exception as e:
             print(f"Error connecting consumer: {e}")
             return False
     
+    async def _seek_consumer(self, start_offsets, last_n, start_timestamp_ms,
+                             stop_offsets, stop_timestamp_ms):
+        """Position the group-less consumer and resolve stop offsets."""
+        partitions = list(self.consumer.assignment())
+        if not partitions:
+            return
+        
+        if start_offsets is not None:
+            for tp in partitions:
+                offset = _offset_for(start_offsets, tp)
+                if offset is None:
+                    self.consumer.pause(tp)
+                else:
+                    self.consumer.seek(tp, offset)
+        elif last_n is not None:
+            beginning = await self.consumer.beginning_offsets(partitions)
+            end = await self.consumer.end_offsets(partitions)
+            for tp in partitions:
+                self.consumer.seek(tp, max(beginning[tp], end[tp] - last_n))
+        elif start_timestamp_ms is not None:
+            found = await self.consumer.offsets_for_times({tp: start_timestamp_ms for tp in partitions})
+            end = await self.consumer.end_offsets(partitions)
+            for tp in partitions:
+                self.consumer.seek(tp, found[tp].offset if found[tp] else end[tp])
+        else:
+            await self.consumer.seek_to_beginning(*partitions)
+        
+        if stop_offsets is not None:
+            for tp in partitions:
+                offset = _offset_for(stop_offsets, tp)
+                if offset is not None:
+                    self._stop_offsets[tp] = offset
+        elif stop_timestamp_ms is not None:
+            found = await self.consumer.offsets_for_times({tp: stop_timestamp_ms for tp in partitions})
+            end = await self.consumer.end_offsets(partitions)
+            for tp in partitions:
+                self._stop_offsets[tp] = found[tp].offset if found[tp] else end[tp]
+        
+        await self._pause_stopped()
+    
+    async def _pause_stopped(self):
+        """
+        Pause partitions whose position has reached their stop offset.
+        
+        Stop offsets from end_offsets() also count offsets that are never
+        delivered (transaction markers, compacted records), so the consumer
+        position, not the last delivered record, decides when a partition is done.
+        """
+        paused = self.consumer.paused()
+        for tp, stop in self._stop_offsets.items():
+            if tp not in paused and await self.consumer.position(tp) >= stop:
+                self.consumer.pause(tp)
+    
+    def _reached_stop(self, tp: TopicPartition, next_offset: int) -> bool:
+        """Pause the partition and return True if next_offset is at or past its stop offset."""
+        stop = self._stop_offsets.get(tp)
+        if stop is None or next_offset < stop:
+            return False
+        self.consumer.pause(tp)
+        return True
+    
+    def _bounded_read_done(self) -> bool:
+        """Return True when every partition still being read has reached its stop offset."""
+        if not self._stop_offsets:
+            return False
+        active = self.consumer.assignment() - self.consumer.paused()
+        return not active
+    
     async def create_topic(self, topic_name: str, num_partitions: int = 1, replication_factor: int = 1) -> bool:
         """
         Create a new Kafka topic.
@@ -118,48 +387,234 @@ class KafkaManager:
                 return False
         
         try:
-            await self.producer.send_and_wait(topic, value=message, key=key)
+            data = serialize_value(message)
+            token = PROFILER.begin('produce;send_and_wait') if PROFILER.enabled else 0
+            await self.producer.send_and_wait(topic, value=data, key=key)
+            if token:
+                PROFILER.end('produce;send_and_wait', token)
             return True
         except Exception as e:
             print(f"Error sending message: {e}")
             return False
     
-    async def consume_messages(self, callback: Callable, should_continue: Optional[Callable[[], bool]] = None) -> None:
+    async def send_transaction(self, topic: str, messages: List[tuple]) -> bool:
+        """
+        Send messages atomically: begin a transaction, send them all, commit.
+        
+        If any send fails the transaction is aborted, and read_committed
+        consumers see none of the messages. Requires a producer connected
+        with a transactional_id.
+        
+        Args:
+            topic: Topic name
+            messages: List of (key, value) pairs
+            
+        Returns:
+            True if the transaction committed, False otherwise
+        """
+        if not self.producer:
+            print("Error in transaction: producer is not connected")
+            return False
+        
+        try:
+            messages = [(key, serialize_value(value)) for key, value in messages]
+            token = PROFILER.begin('produce;transaction') if PROFILER.enabled else 0
+            async with self.producer.transaction():
+                for key, value in messages:
+                    await self.producer.send(topic, value=value, key=key)
+            if token:
+                PROFILER.end('produce;transaction', token)
+            return True
+        except Exception as e:
+            print(f"Error in transaction: {e}")
+            return False
+    
+    async def transform_messages(self, output_topic: str, transform: Callable, group_id: str,
+                                 should_continue: Optional[Callable[[], bool]] = None,
+                                 poll_timeout_ms: int = 200, max_records: Optional[int] = None) -> int:
+        """
+        Consume, transform and produce with exactly-once semantics.
+        
+        Each polled batch is transformed and produced in one transaction
+        together with the batch's consumed offsets, so the output and the
+        input progress commit or abort together. Requires a producer connected
+        with a transactional_id and a consumer in group_id connected with
+        enable_auto_commit=False (and isolation_level='read_committed' to skip
+        aborted input).
+        
+        Args:
+            output_topic: Topic to produce transformed messages to
+            transform: Function (key, value) returning None to drop the message,
+                a (key, value) pair, or a list of pairs
+            group_id: Consumer group whose offsets are committed in the transaction
+            should_continue: Optional function that returns False to stop
+            poll_timeout_ms: Maximum time to wait for a batch before re-checking should_continue
+            max_records: Optional maximum number of input messages per transaction
+            
+        Returns:
+            Number of input messages processed
+        """
+        if not self.consumer or not self.producer:
+            return 0
+        
+        processed = 0
+        while should_continue is None or should_continue():
+            token = PROFILER.begin('consume;poll') if PROFILER.enabled else 0
+            batches = await self.consumer.getmany(timeout_ms=poll_timeout_ms, max_records=max_records)
+            if token:
+                PROFILER.end('consume;poll', token)
+            if not batches:
+                continue
+            
+            try:
+                token = PROFILER.begin('transform;transaction') if PROFILER.enabled else 0
+                async with self.producer.transaction():
+                    offsets = {}
+                    for tp, messages in batches.items():
+                        for msg in messages:
+                            value = deserialize_value(msg.value) if msg.value is not None else None
+                            output = transform(msg.key.decode('utf-8') if msg.key else None, value)
+                            if output is None:
+                                continue
+                            for key, out_value in (output if isinstance(output, list) else [output]):
+                                data = serialize_value(out_value, 'transform;transaction;serialize')
+                                await self.producer.send(output_topic, value=data, key=key)
+                        offsets[tp] = messages[-1].offset + 1
+                    await self.producer.send_offsets_to_transaction(offsets, group_id)
+                if token:
+                    PROFILER.end('transform;transaction', token)
+            except Exception as e:
+                # The transaction was aborted: rewind so the batch is not skipped
+                for tp, messages in batches.items():
+                    self.consumer.seek(tp, messages[0].offset)
+                print(f"Error in transform transaction: {e}")
+                raise
+            processed += sum(len(messages) for messages in batches.values())
+        return processed
+    
+    async def consume_messages(self, callback: Callable, should_continue: Optional[Callable[[], bool]] = None,
+                               poll_timeout_ms: int = 200, message_filter: Optional[MessageFilter] = None) -> None:
         """
         Consume messages and call callback for each message.
         
+        Messages are polled in batches with a timeout, so should_continue is
+        checked at least every poll_timeout_ms even when the topic is idle.
+        Returns when should_continue() is False or, for bounded reads, once
+        every partition has reached its stop offset.
+        
+        Records arrive undecoded: message_filter's partition, key and byte
+        checks run first, and only records that pass are JSON-decoded and
+        checked against its JSON-path predicates. Partitions the filter
+        excludes are paused, so they are not fetched at all.
+        
+        If the callback raises, the consumer is rewound to the failing record
+        before the error propagates, so close_consumer() commits only the
+        records that were processed.
+        
         Args:
             callback: Function to call with each message (topic, partition, offset, key, value)
             should_continue: Optional function that returns False to stop consuming
+            poll_timeout_ms: Maximum time to wait for a batch before re-checking should_continue
+            message_filter: Optional filter; non-matching messages are skipped
         """
         if not self.consumer:
             return
         
+        keep_partitions = message_filter.partitions if message_filter is not None else None
+        batches, position = {}, None
         try:
-            async for msg in self.consumer:
-                # Check if we should continue
+            if keep_partitions is not None:
+                self._pause_excluded(keep_partitions)
+            while not self._bounded_read_done():
+                position = None
                 if should_continue and not should_continue():
                     break
                 
-                callback(
-                    msg.topic,
-                    msg.partition,
-                    msg.offset,
-                    msg.key,
-                    msg.value
-                )
+                token = PROFILER.begin('consume;poll') if PROFILER.enabled else 0
+                batches = await self.consumer.getmany(timeout_ms=poll_timeout_ms)
+                if token:
+                    PROFILER.end('consume;poll', token)
+                if keep_partitions is not None:
+                    # A rebalance during the poll may have assigned (unpaused) partitions
+                    self._pause_excluded(keep_partitions)
+                for tp, messages in batches.items():
+                    for msg in messages:
+                        position = (tp, msg.offset)
+                        if self._stop_offsets and self._reached_stop(tp, msg.offset):
+                            break
+                        
+                        if message_filter is None or message_filter.match_raw(msg.partition, msg.key, msg.value):
+                            value = deserialize_value(msg.value) if msg.value is not None else None
+                            if message_filter is None or message_filter.match_value(value):
+                                token = PROFILER.begin('consume;callback') if PROFILER.enabled else 0
+                                callback(
+                                    msg.topic,
+                                    msg.partition,
+                                    msg.offset,
+                                    msg.key.decode('utf-8') if msg.key else None,
+                                    value
+                                )
+                                if token:
+                                    PROFILER.end('consume;callback', token)
+                        
+                        if self._stop_offsets and self._reached_stop(tp, msg.offset + 1):
+                            break
+                if self._stop_offsets:
+                    await self._pause_stopped()
         except Exception as e:
             print(f"Error consuming messages: {e}")
+            if position is not None:
+                self._rewind_batches(batches, *position)
             raise
     
+    def _pause_excluded(self, partitions: frozenset):
+        """Pause assigned partitions outside partitions so they are never fetched."""
+        excluded = [tp for tp in self.consumer.assignment() - self.consumer.paused()
+                    if tp.partition not in partitions]
+        if excluded:
+            self.consumer.pause(*excluded)
+    
+    def _rewind_batches(self, batches: dict, failed_tp: TopicPartition, failed_offset: int):
+        """
+        Seek back to the first unprocessed record of each polled batch.
+        
+        getmany() has already moved the positions past every batch; without this
+        a commit after a failed callback would skip the records it never reached.
+        
+        Args:
+            batches: Batches returned by the last poll, in processing order
+            failed_tp: Partition whose record was being processed
+            failed_offset: Offset of that record
+        """
+        reached = False
+        for tp, messages in batches.items():
+            if tp == failed_tp:
+                reached = True
+                self.consumer.seek(tp, failed_offset)
+            elif reached and messages:
+                self.consumer.seek(tp, messages[0].offset)
+    
+    async def close_consumer(self):
+        """Commit consumed offsets (when in a group) and stop the consumer."""
+        if not self.consumer:
+            return
+        consumer, self.consumer = self.consumer, None
+        try:
+            if self._consumer_group:
+                await consumer.commit()
+        except Exception as e:
+            print(f"Error committing offsets: {e}")
+        finally:
+            await consumer.stop()
+            self._stop_offsets = {}
+            self._consumer_group = None
+    
     async def close(self):
         """Close all Kafka connections."""
         if self.producer:
             await self.producer.stop()
             self.producer = None
-        if self.consumer:
-            await self.consumer.stop()
-            self.consumer = None
+        await self.close_consumer()
         if self.admin_client:
             await self.admin_client.close()
             self.admin_client = None
@@ -198,8 +653,136 @@ class KafkaManager:
             finally:
                 loop.close()
         
-        import threading
         thread = threading.Thread(target=run_in_thread, daemon=True)
         thread.start()
         return thread
 
+
+class ConsumerSession:
+    """
+    Cancellable consumer running on its own thread and event loop.
+    
+    The session owns the manager's consumer for its lifetime: it connects,
+    consumes until stopped (or until a bounded read completes), then commits
+    offsets, stops the consumer and closes its event loop.
+    """
+    
+    def __init__(self, manager: KafkaManager, topics: List[str], callback: Callable,
+                 on_finished: Optional[Callable[[Optional[Exception]], None]] = None,
+                 group_id: str = 'test-group', poll_timeout_ms: int = 200,
+                 message_filter: Optional[MessageFilter] = None,
+                 on_poll: Optional[Callable[[], None]] = None, **position_options):
+        """
+        Initialize the session.
+        
+        Args:
+            manager: Kafka manager whose consumer the session drives
+            topics: List of topics to consume from
+            callback: Function to call with each message (topic, partition, offset, key, value)
+            on_finished: Optional function called from the session thread when it ends,
+                with the error that ended it or None
+            group_id: Consumer group ID
+            poll_timeout_ms: Maximum time between stop checks while the topic is idle
+            message_filter: Optional filter applied before decoding and display
+            on_poll: Optional function called from the session thread before every poll,
+                at least every poll_timeout_ms (e.g. to close idle aggregation windows)
+            position_options: Start/stop options for connect_consumer()
+        """
+        self.manager = manager
+        self.topics = topics
+        self.callback = callback
+        self.on_finished = on_finished
+        self.group_id = group_id
+        self.poll_timeout_ms = poll_timeout_ms
+        self.message_filter = message_filter
+        self.on_poll = on_poll
+        self.position_options = position_options
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        """True while the session thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> 'ConsumerSession':
+        """
+        Start consuming on a background thread.
+        
+        Returns:
+            The session itself, for chaining
+        """
+        self._thread = threading.Thread(target=self._run_thread, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self, timeout: float = 5.0) -> bool:
+        """
+        Stop consuming and release the consumer, thread and event loop.
+        
+        Args:
+            timeout: Seconds to wait for the session to finish (0 to not wait)
+            
+        Returns:
+            True if the session has finished, False if it is still shutting down
+        """
+        self._stop_event.set()
+        loop, task = self._loop, self._task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # Loop already closed
+        
+        if self._thread is None:
+            return True
+        if timeout and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return not self._thread.is_alive()
+    
+    def _run_thread(self):
+        """Thread target: run the session on a fresh event loop."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        error = None
+        try:
+            self._task = loop.create_task(self._run())
+            loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            error = e
+        finally:
+            # Closing runs outside the cancellable task so a late stop() cannot interrupt it
+            try:
+                loop.run_until_complete(self.manager.close_consumer())
+            except Exception as e:
+                error = error or e
+            self._loop = None
+            self._task = None
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+        
+        if self.on_finished:
+            self.on_finished(error)
+    
+    async def _run(self):
+        """Connect and consume until stopped."""
+        if self._stop_event.is_set():
+            return
+        if not await self.manager.connect_consumer(self.topics, self.group_id, **self.position_options):
+            raise RuntimeError("Failed to start consumer")
+        def should_continue():
+            if self.on_poll:
+                self.on_poll()
+            return not self._stop_event.is_set()
+        
+        await self.manager.consume_messages(
+            self.callback,
+            should_continue=should_continue,
+            poll_timeout_ms=self.poll_timeout_ms,
+            message_filter=self.message_filter
+        )
@@ -0,0 +1,247 @@
+"""
+Consumer-side message filters, compiled once and applied before decoding.
+
+A filter is built from a semicolon-separated spec, for example:
+
+    partition=0,2; key^=user-; contains=ERROR; $.status==failed; $.amount>100
+
+Supported terms (all must match):
+    key=VALUE          key equals VALUE
+    key^=PREFIX        key starts with PREFIX
+    key~=REGEX         key matches REGEX (search)
+    partition=0,1      partition is in the set
+    contains=TEXT      raw value bytes contain TEXT
+    $.a.b OP VALUE     JSON field comparison, OP one of == != > >= < <= ~=
+    $.a.b              JSON field exists
+
+Partition, key and byte-substring checks run on the raw record, so records
+they reject are never JSON-decoded. JSON-path predicates run after decoding.
+The consumer also pauses the partitions a partition term excludes, so their
+records are not fetched at all.
+
+contains= matches the encoded value bytes. Values produced by this tool are
+JSON with ASCII escaping, so non-ASCII text appears as \\uXXXX escapes and a
+contains= term with non-ASCII characters never matches; use a JSON-path
+predicate ($.field~=TEXT) for those.
+"""
+import json
+import operator
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+
+_MISSING = object()
+
+_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+
+# Longest operators first so '>=' is not parsed as '>'
+_PREDICATE_RE = re.compile(r'^\$((?:\.[^.=!<>~\s]+)+)\s*(==|!=|>=|<=|~=|>|<)?\s*(.*)$')
+
+
+def _parse_literal(text: str):
+    """Parse a predicate value as JSON, falling back to a plain string."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _lookup(value, path: Tuple[str, ...]):
+    """Follow a path of object keys / list indexes, returning _MISSING if absent."""
+    for part in path:
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.lstrip('-').isdigit():
+            index = int(part)
+            value = value[index] if -len(value) <= index < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def get_field(value, path: str, default=None):
+    """
+    Return the field at a JSON path such as '$.order.amount' or 'items.0.id'.
+
+    Args:
+        value: Decoded message value
+        path: Dot-separated path, optionally prefixed with '$'
+        default: Returned when the path does not exist
+
+    Returns:
+        The field value, or default
+    """
+    field = _lookup(value, tuple(part for part in path.lstrip('$').split('.') if part))
+    return default if field is _MISSING else field
+
+
+def _compile_predicate(path: Tuple[str, ...], op: Optional[str], literal: str) -> Callable[[Any], bool]:
+    """Compile one JSON-path predicate into a function of the decoded value."""
+    if not op:
+        return lambda value: _lookup(value, path) is not _MISSING
+
+    if op == '~=':
+        pattern = re.compile(literal)
+        expected = None
+
+        def compare(field, _expected):
+            return pattern.search(str(field)) is not None
+    else:
+        expected = _parse_literal(literal)
+        compare = _OPERATORS[op]
+
+    def predicate(value) -> bool:
+        field = _lookup(value, path)
+        if field is _MISSING:
+            return False
+        try:
+            return compare(field, expected)
+        except TypeError:
+            return False
+
+    return predicate
+
+
+class MessageFilter:
+    """Compiled consumer-side filter."""
+
+    def __init__(self, key_equals: Optional[str] = None, key_prefix: Optional[str] = None,
+                 key_regex: Optional[str] = None, partitions: Optional[List[int]] = None,
+                 contains: Optional[str] = None,
+                 json_predicates: Optional[List[Tuple[str, Optional[str], str]]] = None):
+        """
+        Compile the filter.
+
+        Args:
+            key_equals: Exact key
+            key_prefix: Key prefix
+            key_regex: Regular expression searched in the key
+            partitions: Partitions to keep
+            contains: Substring the raw value must contain
+            json_predicates: List of (path, operator, value) such as ('$.status', '==', 'failed');
+                a None operator only checks that the path exists
+        """
+        self._key_equals = key_equals.encode('utf-8') if key_equals is not None else None
+        self._key_prefix = key_prefix.encode('utf-8') if key_prefix is not None else None
+        self._key_regex = re.compile(key_regex.encode('utf-8')) if key_regex is not None else None
+        self._partitions = frozenset(partitions) if partitions is not None else None
+        self._contains = contains.encode('utf-8') if contains else None
+        self._checks_key = any(c is not None for c in (self._key_equals, self._key_prefix, self._key_regex))
+
+        self._predicates = []
+        for path, op, literal in json_predicates or []:
+            parts = tuple(part for part in path.lstrip('$').split('.') if part)
+            self._predicates.append(_compile_predicate(parts, op, literal))
+
+    @classmethod
+    def parse(cls, spec: str) -> Optional['MessageFilter']:
+        """
+        Build a filter from a spec string (see module docstring).
+
+        Args:
+            spec: Semicolon-separated filter terms
+
+        Returns:
+            The compiled filter, or None if spec is empty
+
+        Raises:
+            ValueError: If a term cannot be parsed
+        """
+        options = {'json_predicates': []}
+        for term in spec.split(';'):
+            term = term.strip()
+            if not term:
+                continue
+            if term.startswith('$'):
+                match = _PREDICATE_RE.match(term)
+                if not match or (match.group(2) is None and match.group(3)):
+                    raise ValueError(f"Invalid JSON predicate: {term!r}")
+                options['json_predicates'].append(('$' + match.group(1), match.group(2), match.group(3).strip()))
+            elif term.startswith('key^='):
+                options['key_prefix'] = term[len('key^='):]
+            elif term.startswith('key~='):
+                options['key_regex'] = term[len('key~='):]
+            elif term.startswith('key='):
+                options['key_equals'] = term[len('key='):]
+            elif term.startswith('partition='):
+                options['partitions'] = [int(p) for p in term[len('partition='):].split(',') if p.strip()]
+            elif term.startswith('contains='):
+                options['contains'] = term[len('contains='):]
+            else:
+                raise ValueError(f"Unknown filter term: {term!r}")
+
+        try:
+            message_filter = cls(**options)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        return None if message_filter.is_empty() else message_filter
+
+    def is_empty(self) -> bool:
+        """True if the filter accepts everything."""
+        return (self._partitions is None and not self._checks_key
+                and self._contains is None and not self._predicates)
+
+    @property
+    def partitions(self) -> Optional[frozenset]:
+        """Partitions the filter keeps, or None if it keeps all of them."""
+        return self._partitions
+
+    def keeps_whole_keys(self) -> bool:
+        """
+        True if the filter keeps or drops every message of a key alike.
+
+        Key and partition terms select whole per-key streams; byte-substring
+        and JSON-path terms can drop single messages from a stream.
+        """
+        return self._contains is None and not self._predicates
+
+    def match_raw(self, partition: int, key: Optional[bytes], value: Optional[bytes]) -> bool:
+        """
+        Apply the cheap checks on the undecoded record.
+
+        Args:
+            partition: Record partition
+            key: Raw key bytes
+            value: Raw value bytes
+
+        Returns:
+            False if the record can be rejected without decoding
+        """
+        if self._partitions is not None and partition not in self._partitions:
+            return False
+        if self._checks_key:
+            if key is None:
+                return False
+            if self._key_equals is not None and key != self._key_equals:
+                return False
+            if self._key_prefix is not None and not key.startswith(self._key_prefix):
+                return False
+            if self._key_regex is not None and self._key_regex.search(key) is None:
+                return False
+        if self._contains is not None and (value is None or self._contains not in value):
+            return False
+        return True
+
+    def match_value(self, value) -> bool:
+        """
+        Apply the JSON-path predicates on the decoded value.
+
+        Args:
+            value: Decoded message value
+
+        Returns:
+            True if every predicate matches
+        """
+        for predicate in self._predicates:
+            if not predicate(value):
+                return False
+        return True
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Precomputed synthetic payload generator for load tests.
+
+Payloads are built from a simple schema, serialized to JSON once into a pool
+of buffers and then cycled through. Only the fixed-width 'sequence' and
+'timestamp' slots are patched in place per message, so generating a payload
+costs next to nothing compared to sending it.
+
+Usage:
+    python3 payload_generator.py TOPIC [--bootstrap-servers HOST:PORT]
+        [--messages N] [--schema user=str:12,amount=float,count=int]
+        [--sizes 256:0.9,4096:0.1] [--keys 1000] [--key-distribution zipf]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from kafka_manager import KafkaManager
+from profiling import PROFILER, install_dump_signal
+
+
+SEQUENCE_WIDTH = 20
+TIMESTAMP_WIDTH = 15
+
+# JSON allows whitespace before a value, so right-aligned numbers keep the
+# document valid while giving every slot a fixed width.
+_SEQUENCE_PLACEHOLDER = ' ' * (SEQUENCE_WIDTH - 1) + '0'
+_TIMESTAMP_PLACEHOLDER = ' ' * (TIMESTAMP_WIDTH - 1) + '0'
+
+
+def parse_schema(spec: str) -> Dict[str, str]:
+    """
+    Parse a schema such as 'user=str:12,amount=float,count=int,active=bool'.
+
+    Args:
+        spec: Comma-separated 'name=type[:length]' entries
+
+    Returns:
+        Mapping of field name to type spec
+    """
+    schema = {}
+    for part in spec.split(','):
+        if part.strip():
+            name, _, field_type = part.strip().partition('=')
+            schema[name] = field_type or 'str'
+    return schema
+
+
+def parse_size_distribution(spec: str) -> List[Tuple[int, float]]:
+    """
+    Parse a payload-size distribution such as '256:0.9,4096:0.1'.
+
+    Weights are optional and default to 1.
+
+    Args:
+        spec: Comma-separated 'size[:weight]' entries
+
+    Returns:
+        List of (size_bytes, weight) tuples
+    """
+    distribution = []
+    for part in spec.split(','):
+        size, _, weight = part.strip().partition(':')
+        distribution.append((int(size), float(weight) if weight else 1.0))
+    return distribution
+
+
+class PayloadGenerator:
+    """Cycles through a pool of pre-serialized JSON payloads."""
+
+    def __init__(self, schema: Optional[Dict[str, str]] = None,
+                 sizes: Optional[List[Tuple[int, float]]] = None,
+                 num_keys: int = 100, key_distribution: str = 'uniform',
+                 zipf_s: float = 1.1, pool_size: int = 1024, seed: int = 0):
+        """
+        Build the payload pool.
+
+        Args:
+            schema: Mapping of field name to type ('str[:length]', 'int', 'float', 'bool')
+            sizes: Target payload sizes as (size_bytes, weight); payloads are padded up to size
+            num_keys: Number of distinct message keys (0 for unkeyed messages)
+            key_distribution: 'uniform' or 'zipf'
+            zipf_s: Zipf exponent when key_distribution is 'zipf'
+            pool_size: Number of pre-serialized payloads to cycle through
+            seed: Random seed for reproducible pools
+        """
+        if key_distribution not in ('uniform', 'zipf'):
+            raise ValueError(f"Unknown key distribution: {key_distribution}")
+
+        self.schema = schema or {'message': 'str:16'}
+        self.sizes = sizes or [(256, 1.0)]
+        self.pool_size = pool_size
+        self._rng = random.Random(seed)
+        # Lets consumers tell this run's per-key sequences from other producers'
+        self.producer_id = uuid.uuid4().hex
+
+        self.keys = [f"key-{i}".encode('utf-8') for i in range(num_keys)]
+        if num_keys:
+            if key_distribution == 'zipf':
+                weights = [1 / (i + 1) ** zipf_s for i in range(num_keys)]
+            else:
+                weights = None
+            key_indexes = self._rng.choices(range(num_keys), weights=weights, k=pool_size)
+        else:
+            key_indexes = [-1] * pool_size
+
+        self._pool: List[Tuple[int, bytearray, int, int]] = []
+        target_sizes = self._rng.choices(
+            [s for s, _ in self.sizes], weights=[w for _, w in self.sizes], k=pool_size
+        )
+        for key_index, target_size in zip(key_indexes, target_sizes):
+            buf, sequence_offset, timestamp_offset = self._build(target_size)
+            self._pool.append((key_index, buf, sequence_offset, timestamp_offset))
+
+        self._sequences = [0] * max(num_keys, 1)
+        self._index = 0
+
+    def _random_value(self, field_type: str):
+        """Generate a random value for a schema type."""
+        base, _, length = field_type.partition(':')
+        if base == 'str':
+            n = int(length) if length else 16
+            return ''.join(self._rng.choices(string.ascii_letters + string.digits, k=n))
+        if base == 'int':
+            return self._rng.randint(0, 1_000_000)
+        if base == 'float':
+            return round(self._rng.uniform(0, 1000), 4)
+        if base == 'bool':
+            return self._rng.random() < 0.5
+        raise ValueError(f"Unknown field type: {field_type}")
+
+    def _build(self, target_size: int) -> Tuple[bytearray, int, int]:
+        """Serialize one payload and locate its sequence/timestamp slots."""
+        document = {'producer_id': self.producer_id, 'sequence': 0, 'timestamp': 0}
+        for name, field_type in self.schema.items():
+            document[name] = self._random_value(field_type)
+
+        text = json.dumps(document, separators=(',', ':'))
+        text = text.replace('"sequence":0', '"sequence":' + _SEQUENCE_PLACEHOLDER, 1)
+        text = text.replace('"timestamp":0', '"timestamp":' + _TIMESTAMP_PLACEHOLDER, 1)
+
+        padding = target_size - len(text.encode('utf-8')) - len(',"pad":""')
+        if padding > 0:
+            text = text[:-1] + ',"pad":"' + 'x' * padding + '"}'
+
+        buf = bytearray(text.encode('utf-8'))
+        sequence_offset = buf.index(b'"sequence":') + len(b'"sequence":')
+        timestamp_offset = buf.index(b'"timestamp":') + len(b'"timestamp":')
+        return buf, sequence_offset, timestamp_offset
+
+    def next(self) -> Tuple[Optional[bytes], bytearray]:
+        """
+        Return the next (key, payload) pair.
+
+        The payload buffer is reused after pool_size further calls, so it must
+        be handed to the producer before then (send() copies it into a batch).
+        The 'sequence' field counts up per key, so consumers can check it
+        per (producer_id, key) with SequenceChecker.
+
+        Returns:
+            Tuple of (encoded key or None, payload buffer)
+        """
+        key_index, buf, sequence_offset, timestamp_offset = self._pool[self._index]
+        self._index += 1
+        if self._index == self.pool_size:
+            self._index = 0
+
+        slot = key_index if key_index >= 0 else 0
+        sequence = self._sequences[slot] + 1
+        self._sequences[slot] = sequence
+
+        buf[sequence_offset:sequence_offset + SEQUENCE_WIDTH] = b'%*d' % (SEQUENCE_WIDTH, sequence)
+        buf[timestamp_offset:timestamp_offset + TIMESTAMP_WIDTH] = b'%*d' % (
+            TIMESTAMP_WIDTH, time.time_ns() // 1_000_000
+        )
+        return (self.keys[key_index] if key_index >= 0 else None), buf
+
+
+async def run_load(bootstrap_servers: str, topic: str, generator: PayloadGenerator,
+                   messages: int, **producer_config) -> Dict:
+    """
+    Send generated payloads as fast as the producer accepts them.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topic: Target topic
+        generator: Payload generator
+        messages: Number of messages to send
+        producer_config: Extra AIOKafkaProducer settings
+
+    Returns:
+        Dictionary with messages sent, bytes sent, elapsed seconds and throughput
+    """
+    manager = KafkaManager(bootstrap_servers)
+    try:
+        if not await manager.connect_producer(**producer_config):
+            raise RuntimeError("Failed to connect producer")
+        producer = manager.producer
+
+        total_bytes = 0
+        futures = []
+        start = time.perf_counter()
+        for _ in range(messages):
+            token = PROFILER.begin('produce;generate') if PROFILER.enabled else 0
+            key, payload = generator.next()
+            if token:
+                PROFILER.end('produce;generate', token)
+            total_bytes += len(payload)
+            token = PROFILER.begin('produce;send') if PROFILER.enabled else 0
+            futures.append(await producer.send(topic, payload, key=key))
+            if token:
+                PROFILER.end('produce;send', token)
+        await asyncio.gather(*futures)
+        elapsed = time.perf_counter() - start
+    finally:
+        await manager.close()
+
+    return {
+        'messages': messages,
+        'bytes': total_bytes,
+        'elapsed_sec': round(elapsed, 3),
+        'messages_per_sec': round(messages / elapsed, 1),
+        'mb_per_sec': round(total_bytes / elapsed / 1_000_000, 3),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Produce synthetic load from a pre-serialized payload pool.")
+    parser.add_argument('topic', help="Target topic")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--schema', default='message=str:16', help="e.g. user=str:12,amount=float,count=int")
+    parser.add_argument('--sizes', default='256', help="Payload-size distribution, e.g. 256:0.9,4096:0.1")
+    parser.add_argument('--keys', type=int, default=100, help="Number of distinct keys (0 for none)")
+    parser.add_argument('--key-distribution', choices=['uniform', 'zipf'], default='uniform')
+    parser.add_argument('--pool-size', type=int, default=1024)
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    install_dump_signal()
+    generator = PayloadGenerator(
+        schema=parse_schema(args.schema),
+        sizes=parse_size_distribution(args.sizes),
+        num_keys=args.keys,
+        key_distribution=args.key_distribution,
+        pool_size=args.pool_size,
+    )
+    try:
+        stats = asyncio.run(run_load(args.bootstrap_servers, args.topic, generator, args.messages))
+    except Exception as e:
+        print(f"Error running load: {e}")
+        sys.exit(1)
+    print(f"Sent {stats['messages']} messages ({stats['bytes']} bytes) in {stats['elapsed_sec']}s: "
+          f"{stats['messages_per_sec']} msg/s, {stats['mb_per_sec']} MB/s")
+    if PROFILER.enabled:
+        print(PROFILER.format_breakdown())
+
+
+if __name__ == "__main__":
+    main()
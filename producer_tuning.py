@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Producer tuning sweep.
+
+Sweeps linger_ms, max_batch_size, compression_type and acks against a target
+topic, measures throughput and tail latency for each combination and reports
+the Pareto-best settings as a ready-to-use producer config.
+
+Usage:
+    python3 producer_tuning.py TOPIC [--bootstrap-servers HOST:PORT]
+        [--messages N] [--sizes 100:0.8,4096:0.2]
+        [--linger-ms 0,5,20] [--batch-size 16384,65536]
+        [--compression none,gzip,lz4] [--acks 1,all]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from kafka_manager import KafkaManager
+from profiling import install_dump_signal
+from payload_generator import PayloadGenerator, parse_size_distribution
+
+
+def parse_acks(value: str):
+    """Parse an acks value ('0', '1' or 'all')."""
+    return value if value == 'all' else int(value)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Return the pct-th percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def measure(bootstrap_servers: str, topic: str, config: Dict, generator: PayloadGenerator,
+                  messages: int, warmup: int = 100) -> Dict:
+    """
+    Measure throughput and latency of one producer configuration.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topic: Target topic
+        config: AIOKafkaProducer settings to test
+        generator: Source of message payloads
+        messages: Number of messages to measure
+        warmup: Number of messages sent before measuring
+
+    Returns:
+        Result dictionary with the config and its metrics, or an 'error' entry
+    """
+    manager = KafkaManager(bootstrap_servers)
+    result = {'config': config}
+    try:
+        if not await manager.connect_producer(**config):
+            result['error'] = "failed to connect producer"
+            return result
+        producer = manager.producer
+
+        for _ in range(warmup):
+            key, payload = generator.next()
+            await producer.send(topic, payload, key=key)
+        await producer.flush()
+
+        latencies: List[float] = []
+        futures = []
+        total_bytes = 0
+        start = time.perf_counter()
+        for _ in range(messages):
+            key, payload = generator.next()
+            total_bytes += len(payload)
+            sent_at = time.perf_counter()
+            future = await producer.send(topic, payload, key=key)
+            future.add_done_callback(
+                lambda f, t=sent_at: latencies.append(time.perf_counter() - t)
+            )
+            futures.append(future)
+        await asyncio.gather(*futures)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        result.update({
+            'messages_per_sec': round(messages / elapsed, 1),
+            'mb_per_sec': round(total_bytes / elapsed / 1_000_000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+        })
+    except Exception as e:
+        result['error'] = str(e) or e.__class__.__name__
+    finally:
+        await manager.close()
+    return result
+
+
+def pareto_front(results: List[Dict]) -> List[Dict]:
+    """
+    Return the results not dominated on (higher throughput, lower p99 latency).
+
+    Args:
+        results: Successful measurement results
+
+    Returns:
+        Pareto-optimal results, sorted by descending throughput
+    """
+    front = []
+    for r in results:
+        dominated = any(
+            o['messages_per_sec'] >= r['messages_per_sec'] and o['p99_ms'] <= r['p99_ms']
+            and (o['messages_per_sec'] > r['messages_per_sec'] or o['p99_ms'] < r['p99_ms'])
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: -r['messages_per_sec'])
+
+
+def recommend(front: List[Dict], max_p99_ms: Optional[float] = None) -> Optional[Dict]:
+    """
+    Pick the highest-throughput Pareto config within the latency budget.
+
+    Args:
+        front: Pareto-optimal results
+        max_p99_ms: Optional p99 latency budget in milliseconds
+
+    Returns:
+        The recommended result, or None if nothing fits the budget
+    """
+    candidates = [r for r in front if max_p99_ms is None or r['p99_ms'] <= max_p99_ms]
+    return candidates[0] if candidates else None
+
+
+async def sweep(bootstrap_servers: str, topic: str, grid: Dict[str, list],
+                generator: PayloadGenerator, messages: int, warmup: int = 100) -> List[Dict]:
+    """
+    Measure every combination in the parameter grid, one at a time.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topic: Target topic
+        grid: Mapping of producer setting name to candidate values
+        generator: Source of message payloads
+        messages: Number of messages to measure per combination
+        warmup: Number of warmup messages per combination
+
+    Returns:
+        List of measurement results
+    """
+    names = list(grid)
+    results = []
+    for values in itertools.product(*(grid[n] for n in names)):
+        config = dict(zip(names, values))
+        result = await measure(bootstrap_servers, topic, config, generator, messages, warmup)
+        results.append(result)
+        if 'error' in result:
+            print(f"  {config}: ERROR {result['error']}", file=sys.stderr)
+        else:
+            print(f"  {config}: {result['messages_per_sec']} msg/s, "
+                  f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms", file=sys.stderr)
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Sweep producer settings and report the best configs.")
+    parser.add_argument('topic', help="Target topic")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    parser.add_argument('--messages', type=int, default=5000, help="Messages per combination")
+    parser.add_argument('--warmup', type=int, default=100, help="Warmup messages per combination")
+    parser.add_argument('--sizes', default='1024', help="Message-size distribution, e.g. 100:0.8,4096:0.2")
+    parser.add_argument('--keys', type=int, default=100, help="Number of distinct message keys")
+    parser.add_argument('--linger-ms', default='0,5,20')
+    parser.add_argument('--batch-size', default='16384,65536')
+    parser.add_argument('--compression', default='none,gzip')
+    parser.add_argument('--acks', default='1,all')
+    parser.add_argument('--max-p99-ms', type=float, help="p99 latency budget for the recommendation")
+    parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    install_dump_signal()
+    grid = {
+        'linger_ms': [int(v) for v in args.linger_ms.split(',')],
+        'max_batch_size': [int(v) for v in args.batch_size.split(',')],
+        'compression_type': [None if v == 'none' else v for v in args.compression.split(',')],
+        'acks': [parse_acks(v) for v in args.acks.split(',')],
+    }
+    generator = PayloadGenerator(sizes=parse_size_distribution(args.sizes), num_keys=args.keys)
+
+    print(f"Sweeping {len(list(itertools.product(*grid.values())))} combinations "
+          f"on {args.topic}...", file=sys.stderr)
+    results = asyncio.run(sweep(args.bootstrap_servers, args.topic, grid, generator,
+                                args.messages, args.warmup))
+    ok = [r for r in results if 'error' not in r]
+    front = pareto_front(ok)
+    best = recommend(front, args.max_p99_ms)
+
+    if args.json:
+        print(json.dumps({'results': results, 'pareto': front,
+                          'recommended': best['config'] if best else None}, indent=2))
+    else:
+        print("\nPareto-best settings (throughput vs p99 latency):")
+        for r in front:
+            print(f"  {r['messages_per_sec']:>10} msg/s  {r['mb_per_sec']:>8} MB/s  "
+                  f"p99 {r['p99_ms']:>8} ms  {r['config']}")
+        if best:
+            print("\nRecommended producer config:")
+            print(json.dumps(best['config'], indent=2))
+        else:
+            print("\nNo configuration met the requested latency budget.")
+
+    sys.exit(0 if best else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Opt-in stage-level profiling for the produce/consume pipeline.
+
+Stages are named as semicolon-separated stacks (e.g. 'consume;deserialize')
+so the profile can be dumped in collapsed-stack format for flamegraph tools,
+alongside a per-stage latency breakdown.
+
+Instrumented code follows this pattern, which costs one attribute check per
+stage when profiling is disabled:
+
+    token = PROFILER.begin('consume;callback') if PROFILER.enabled else 0
+    callback(...)
+    if token:
+        PROFILER.end('consume;callback', token)
+
+Profiling can be enabled at startup with KAFKA_PROFILE=<sample_every>
+(e.g. KAFKA_PROFILE=10 times every 10th call of each stage).
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class StageProfiler:
+    """Samples per-stage durations and reports them as a breakdown or collapsed stacks."""
+
+    def __init__(self, max_samples: int = 10000):
+        """
+        Initialize a disabled profiler.
+
+        Args:
+            max_samples: Number of recent samples kept per stage for percentiles
+        """
+        self.enabled = False
+        self.sample_every = 1
+        self.max_samples = max_samples
+        self._lock = threading.RLock()
+        self.reset()
+
+    def enable(self, sample_every: int = 1):
+        """
+        Start profiling.
+
+        Args:
+            sample_every: Time every Nth call of each stage (all calls are counted)
+        """
+        self.sample_every = max(1, sample_every)
+        self.enabled = True
+
+    def disable(self):
+        """Stop profiling; collected data is kept until reset()."""
+        self.enabled = False
+
+    def reset(self):
+        """Discard all collected data."""
+        with self._lock:
+            self._calls: Dict[str, int] = {}
+            self._sampled_calls: Dict[str, int] = {}
+            self._sampled_ns: Dict[str, int] = {}
+            self._samples: Dict[str, deque] = {}
+
+    def begin(self, stage: str) -> int:
+        """
+        Count a call of stage and start timing it if it is sampled.
+
+        Args:
+            stage: Stage name, e.g. 'produce;send_and_wait'
+
+        Returns:
+            Start timestamp in nanoseconds, or 0 if this call is not sampled
+        """
+        with self._lock:
+            calls = self._calls.get(stage, 0) + 1
+            self._calls[stage] = calls
+        if calls % self.sample_every:
+            return 0
+        return time.perf_counter_ns()
+
+    def end(self, stage: str, token: int):
+        """
+        Record the duration of a sampled call started with begin().
+
+        Args:
+            stage: Stage name passed to begin()
+            token: Value returned by begin()
+        """
+        elapsed = time.perf_counter_ns() - token
+        with self._lock:
+            self._sampled_calls[stage] = self._sampled_calls.get(stage, 0) + 1
+            self._sampled_ns[stage] = self._sampled_ns.get(stage, 0) + elapsed
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(elapsed)
+
+    def _estimated_totals(self) -> Dict[str, float]:
+        """Estimate total nanoseconds per stage, scaling sampled time up to all calls."""
+        return {
+            stage: sampled_ns / self._sampled_calls[stage] * self._calls[stage]
+            for stage, sampled_ns in self._sampled_ns.items()
+        }
+
+    def breakdown(self) -> List[dict]:
+        """
+        Summarize each stage.
+
+        Returns:
+            List of dicts with stage, calls, sampled, est_total_ms, mean_us, p50_us, p95_us, p99_us
+        """
+        with self._lock:
+            totals = self._estimated_totals()
+            rows = []
+            for stage, samples in self._samples.items():
+                ordered = sorted(samples)
+
+                def pct(p):
+                    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] / 1000
+
+                rows.append({
+                    'stage': stage,
+                    'calls': self._calls.get(stage, 0),
+                    'sampled': self._sampled_calls[stage],
+                    'est_total_ms': round(totals[stage] / 1e6, 3),
+                    'mean_us': round(sum(ordered) / len(ordered) / 1000, 2),
+                    'p50_us': round(pct(50), 2),
+                    'p95_us': round(pct(95), 2),
+                    'p99_us': round(pct(99), 2),
+                })
+        return sorted(rows, key=lambda r: r['stage'])
+
+    def format_breakdown(self) -> str:
+        """Format the breakdown as an aligned text table."""
+        rows = self.breakdown()
+        if not rows:
+            return "No profile samples collected"
+        width = max(len(r['stage']) for r in rows)
+        lines = [f"{'stage':<{width}}  {'calls':>9}  {'total ms':>10}  {'mean us':>9}  "
+                 f"{'p50 us':>9}  {'p95 us':>9}  {'p99 us':>9}"]
+        for r in rows:
+            lines.append(f"{r['stage']:<{width}}  {r['calls']:>9}  {r['est_total_ms']:>10}  "
+                         f"{r['mean_us']:>9}  {r['p50_us']:>9}  {r['p95_us']:>9}  {r['p99_us']:>9}")
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        """
+        Dump the profile in collapsed-stack format ('a;b;c <microseconds>').
+
+        Parent stages are reported with their children's time subtracted so
+        the output can be fed to flamegraph.pl or speedscope as-is.
+
+        Returns:
+            Collapsed-stack text, one stack per line
+        """
+        with self._lock:
+            totals = self._estimated_totals()
+        exclusive = dict(totals)
+        for stage, total in totals.items():
+            parent = stage.rpartition(';')[0]
+            if parent in exclusive:
+                exclusive[parent] -= total
+        return "\n".join(
+            f"{stage} {int(ns // 1000)}" for stage, ns in sorted(exclusive.items()) if ns >= 1000
+        )
+
+    def dump(self, path: str):
+        """
+        Write the collapsed-stack profile to path and the breakdown next to it.
+
+        Args:
+            path: Output path for the collapsed stacks (breakdown goes to path + '.txt')
+        """
+        with open(path, 'w') as f:
+            f.write(self.collapsed() + "\n")
+        with open(path + '.txt', 'w') as f:
+            f.write(self.format_breakdown() + "\n")
+
+
+PROFILER = StageProfiler()
+
+if os.getenv('KAFKA_PROFILE'):
+    PROFILER.enable(sample_every=int(os.getenv('KAFKA_PROFILE') or 1))
+
+
+def install_dump_signal(path: Optional[str] = None, signum: Optional[int] = None):
+    """
+    Dump the profile whenever the process receives a signal (SIGUSR1 by default).
+
+    Args:
+        path: Collapsed-stack output path; defaults to kafka-profile-<pid>.folded
+        signum: Signal number to listen on
+    """
+    signum = signum or getattr(signal, 'SIGUSR1', None)
+    if signum is None:
+        return
+    path = path or f"kafka-profile-{os.getpid()}.folded"
+
+    def handler(_signum, _frame):
+        PROFILER.dump(path)
+        print(f"Profile written to {path}\n{PROFILER.format_breakdown()}", file=sys.stderr)
+
+    signal.signal(signum, handler)
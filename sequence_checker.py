@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Sequence integrity checks on consumed messages.
+
+Producers stamp each message with a 'producer_id' and a per-key 'sequence'
+that counts up from 1. The checker tracks the next expected sequence of every
+(topic, producer_id, key) stream and classifies each message:
+
+    ok          the expected sequence
+    new         first message seen from a stream (or one evicted earlier)
+    gap         sequence ahead of the expected one; the skipped ones become missing
+    reorder     a missing sequence arriving late
+    duplicate   a sequence not after the last one seen and not missing
+
+Memory is bounded: streams live in an LRU of at most max_streams entries
+(cold streams are evicted and simply start over as 'new'), and each stream
+remembers at most max_missing skipped sequences. Streams are per topic, so
+copies of a message fanned out to several topics are not duplicates.
+
+Usage (e.g. alongside payload_generator.py, whose payloads carry both fields):
+    python3 sequence_checker.py TOPIC[,TOPIC] [--group-id GROUP] [--interval 5]
+        [--bootstrap-servers HOST:PORT]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from kafka_manager import KafkaManager
+from message_filters import get_field
+from profiling import PROFILER, install_dump_signal
+
+
+SEQUENCE_EVENTS = ['ok', 'new', 'gap', 'reorder', 'duplicate']
+
+
+class _StreamState:
+    """Expected next sequence of one stream and the sequences it skipped."""
+
+    __slots__ = ('expected', 'missing')
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.missing = None
+
+
+class SequenceChecker:
+    """Detects gaps, duplicates and reorders per (topic, producer_id, key) stream."""
+
+    def __init__(self, max_streams: int = 100000, max_missing: int = 1000,
+                 sequence_field: str = '$.sequence', producer_field: str = '$.producer_id'):
+        """
+        Initialize an empty checker.
+
+        Args:
+            max_streams: Maximum number of (topic, producer_id, key) streams tracked
+            max_missing: Maximum number of skipped sequences remembered per stream;
+                older ones are forgotten, so their late arrival counts as a duplicate
+            sequence_field: JSON path of the sequence number
+            producer_field: JSON path of the producer ID (messages without one share a stream per key)
+        """
+        self.max_streams = max_streams
+        self.max_missing = max_missing
+        self.sequence_field = sequence_field
+        self.producer_field = producer_field
+        self._streams: 'OrderedDict[Tuple[str, str, str], _StreamState]' = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        """Forget all streams and zero the counters."""
+        self._streams.clear()
+        self.checked = 0
+        self.unsequenced = 0
+        self.gaps = 0
+        self.missing = 0
+        self.duplicates = 0
+        self.reorders = 0
+        self.evicted = 0
+
+    def check(self, key, value, topic: str = '') -> Tuple[Optional[str], Optional[str]]:
+        """
+        Check one consumed message.
+
+        Args:
+            key: Message key
+            value: Decoded message value
+            topic: Topic the message was consumed from
+
+        Returns:
+            Tuple of (event, detail) where event is one of SEQUENCE_EVENTS, or
+            None for messages without an integer sequence; detail describes
+            gap, reorder and duplicate events
+        """
+        sequence = get_field(value, self.sequence_field)
+        if isinstance(sequence, bool) or not isinstance(sequence, int):
+            self.unsequenced += 1
+            return None, None
+
+        token = PROFILER.begin('consume;callback;sequence_check') if PROFILER.enabled else 0
+        self.checked += 1
+        stream = (topic, str(get_field(value, self.producer_field, '')), key if key is not None else '')
+        state = self._streams.get(stream)
+        if state is None:
+            self._streams[stream] = _StreamState(sequence + 1)
+            if len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+                self.evicted += 1
+            event, detail = 'new', None
+        else:
+            self._streams.move_to_end(stream)
+            event, detail = self._advance(state, sequence)
+        if token:
+            PROFILER.end('consume;callback;sequence_check', token)
+        return event, detail
+
+    def _advance(self, state: _StreamState, sequence: int) -> Tuple[str, Optional[str]]:
+        """Classify sequence against a known stream and update its state."""
+        expected = state.expected
+        if sequence == expected:
+            state.expected = expected + 1
+            return 'ok', None
+
+        if sequence > expected:
+            skipped = sequence - expected
+            self.gaps += 1
+            self.missing += skipped
+            if state.missing is None:
+                state.missing = set()
+            # Remember only the most recent skipped sequences
+            state.missing.update(range(max(expected, sequence - self.max_missing), sequence))
+            if len(state.missing) > self.max_missing:
+                state.missing = set(sorted(state.missing)[-self.max_missing:])
+            state.expected = sequence + 1
+            return 'gap', f"expected {expected}, got {sequence} ({skipped} missing)"
+
+        if state.missing and sequence in state.missing:
+            state.missing.discard(sequence)
+            if not state.missing:
+                state.missing = None
+            self.reorders += 1
+            self.missing -= 1
+            return 'reorder', f"{sequence} arrived after {expected - 1}"
+
+        self.duplicates += 1
+        return 'duplicate', f"{sequence} not after {expected - 1} and not missing"
+
+    @property
+    def streams(self) -> int:
+        """Number of streams currently tracked."""
+        return len(self._streams)
+
+    def metrics(self) -> dict:
+        """
+        Current counters.
+
+        Returns:
+            Dictionary with checked, unsequenced, gaps (gap events), missing
+            (sequences still missing), duplicates, reorders, streams and evicted
+        """
+        return {
+            'checked': self.checked,
+            'unsequenced': self.unsequenced,
+            'gaps': self.gaps,
+            'missing': self.missing,
+            'duplicates': self.duplicates,
+            'reorders': self.reorders,
+            'streams': self.streams,
+            'evicted': self.evicted,
+        }
+
+    def format_metrics(self) -> str:
+        """Format the counters as a single status line."""
+        return (f"Gaps: {self.gaps} ({self.missing} missing) | Duplicates: {self.duplicates} | "
+                f"Reorders: {self.reorders}")
+
+
+def checking_callback(checker: SequenceChecker, on_anomaly: Callable[[str, str], None],
+                      callback: Optional[Callable] = None) -> Callable:
+    """
+    Wrap a consume_messages() callback so every message is also sequence-checked.
+
+    Args:
+        checker: Sequence checker
+        on_anomaly: Called with (event, description) for gap, reorder and duplicate events
+        callback: Optional inner callback(topic, partition, offset, key, value)
+
+    Returns:
+        A callback for consume_messages() / ConsumerSession
+    """
+    def wrapped(topic, partition, offset, key, value):
+        if callback is not None:
+            callback(topic, partition, offset, key, value)
+        event, detail = checker.check(key, value, topic)
+        if detail is not None:
+            on_anomaly(event, f"[{topic}:{partition}:{offset}] Key: {key}: {event} - {detail}")
+
+    return wrapped
+
+
+async def run_checker(bootstrap_servers: str, topics: List[str], checker: SequenceChecker,
+                      group_id: Optional[str] = None, interval: float = 5.0,
+                      duration: Optional[float] = None, verbose: bool = False):
+    """
+    Consume topics, printing the checker's metrics every interval seconds.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topics: Topics to check
+        checker: Sequence checker
+        group_id: Consumer group ID; with a group, rebalances and restarts resume from
+            committed offsets, so redelivered messages show up as duplicates
+        interval: Seconds between metric lines
+        duration: Optional number of seconds to run for
+        verbose: Also print every gap, reorder and duplicate
+    """
+    manager = KafkaManager(bootstrap_servers)
+    deadline = time.monotonic() + duration if duration else None
+    next_report = time.monotonic() + interval
+
+    def on_anomaly(event, description):
+        if verbose:
+            print(description)
+
+    def should_continue():
+        nonlocal next_report
+        now = time.monotonic()
+        if now >= next_report:
+            print(json.dumps(checker.metrics()))
+            next_report = now + interval
+        return deadline is None or now < deadline
+
+    try:
+        if not await manager.connect_consumer(topics, group_id):
+            raise RuntimeError("Failed to start consumer")
+        await manager.consume_messages(checking_callback(checker, on_anomaly),
+                                       should_continue=should_continue)
+    finally:
+        await manager.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Check per-key message sequences on topics.")
+    parser.add_argument('topics', help="Comma-separated topics to check")
+    parser.add_argument('--group-id', help="Consumer group ID (default: no group, read from the earliest offset)")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds between metric lines")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--max-streams', type=int, default=100000)
+    parser.add_argument('--verbose', action='store_true', help="Print every anomaly")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    install_dump_signal()
+    checker = SequenceChecker(max_streams=args.max_streams)
+    topics = [t.strip() for t in args.topics.split(',') if t.strip()]
+    try:
+        asyncio.run(run_checker(args.bootstrap_servers, topics, checker, group_id=args.group_id,
+                                interval=args.interval, duration=args.duration, verbose=args.verbose))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error checking sequences: {e}")
+        sys.exit(1)
+    print(json.dumps(checker.metrics()))
+    sys.exit(1 if checker.gaps or checker.duplicates else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Consumer running in a child process, feeding display lines over shared memory.
+
+The child process consumes, decodes and formats messages, then writes the
+display lines and running stats into a shared-memory ring buffer. The parent
+(e.g. the Tk main loop) polls the ring on a timer, so consumer CPU load never
+competes with the UI for the GIL.
+"""
+import asyncio
+import json
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+from kafka_manager import KafkaManager
+from message_filters import MessageFilter
+
+
+# Header: published sequence, claimed sequence, messages received, state.
+# The writer claims a slot before filling it and publishes it afterwards, so
+# the reader can tell which slots may have been overwritten under it.
+_HEADER = struct.Struct('<QQQQ')
+_CLAIM = struct.Struct('<Q')
+_CLAIM_OFFSET = 8
+_LENGTH = struct.Struct('<I')
+
+STATE_STARTING = 0
+STATE_RUNNING = 1
+STATE_FINISHED = 2
+STATE_FAILED = 3
+
+
+class SharedRing:
+    """Single-writer, single-reader ring of text lines in shared memory."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, slot_size: int, owner: bool):
+        """
+        Wrap an existing shared-memory block. Use create() or attach() instead.
+
+        Args:
+            shm: Shared memory block
+            slots: Number of line slots
+            slot_size: Bytes per slot, including the length prefix
+            owner: True if this side created the block and must unlink it
+        """
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = owner
+        self._buf = shm.buf
+
+    @classmethod
+    def create(cls, slots: int = 4096, slot_size: int = 512) -> 'SharedRing':
+        """
+        Create a new zeroed ring buffer.
+
+        Args:
+            slots: Number of line slots
+            slot_size: Bytes per slot; longer lines are truncated
+
+        Returns:
+            The owning ring buffer
+        """
+        shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + slots * slot_size)
+        shm.buf[:_HEADER.size] = bytes(_HEADER.size)
+        return cls(shm, slots, slot_size, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_size: int) -> 'SharedRing':
+        """
+        Attach to a ring buffer created by another process.
+
+        Args:
+            name: Shared memory block name
+            slots: Number of line slots
+            slot_size: Bytes per slot
+
+        Returns:
+            A non-owning ring buffer
+        """
+        return cls(shared_memory.SharedMemory(name=name), slots, slot_size, owner=False)
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory block."""
+        return self.shm.name
+
+    def header(self) -> Tuple[int, int, int]:
+        """Return (write_seq, messages, state)."""
+        write_seq, _, messages, state = _HEADER.unpack_from(self._buf, 0)
+        return write_seq, messages, state
+
+    def set_state(self, state: int):
+        """Set the state flag (writer side only)."""
+        write_seq, messages, _ = self.header()
+        _HEADER.pack_into(self._buf, 0, write_seq, write_seq, messages, state)
+
+    def write(self, line: str):
+        """
+        Append a line and count it as a received message (writer side only).
+
+        Args:
+            line: Display line
+        """
+        write_seq, messages, state = self.header()
+        _CLAIM.pack_into(self._buf, _CLAIM_OFFSET, write_seq + 1)
+        data = line.encode('utf-8')[:self.slot_size - _LENGTH.size]
+        offset = _HEADER.size + (write_seq % self.slots) * self.slot_size
+        _LENGTH.pack_into(self._buf, offset, len(data))
+        self._buf[offset + _LENGTH.size:offset + _LENGTH.size + len(data)] = data
+        # Publish the slot only after it is fully written
+        _HEADER.pack_into(self._buf, 0, write_seq + 1, write_seq + 1, messages + 1, state)
+
+    def read_since(self, read_seq: int, limit: Optional[int] = None) -> Tuple[List[str], int, int]:
+        """
+        Read lines written after read_seq (reader side).
+
+        Args:
+            read_seq: Sequence returned by the previous call (0 initially)
+            limit: Optional maximum number of lines to return
+
+        Returns:
+            Tuple of (lines, new read_seq, lines dropped because the writer lapped the reader)
+        """
+        write_seq = self.header()[0]
+        dropped = 0
+        if write_seq - read_seq > self.slots:
+            dropped = write_seq - self.slots - read_seq
+            read_seq = write_seq - self.slots
+        end = write_seq if limit is None else min(write_seq, read_seq + limit)
+
+        lines = []
+        for seq in range(read_seq, end):
+            offset = _HEADER.size + (seq % self.slots) * self.slot_size
+            length = _LENGTH.unpack_from(self._buf, offset)[0]
+            lines.append(bytes(self._buf[offset + _LENGTH.size:offset + _LENGTH.size + length])
+                         .decode('utf-8', errors='replace'))
+
+        # Discard slots the writer overwrote (or is overwriting) while we read them
+        claimed = _CLAIM.unpack_from(self._buf, _CLAIM_OFFSET)[0]
+        overwritten = claimed - self.slots - read_seq
+        if overwritten > 0:
+            lines = lines[overwritten:]
+            dropped += min(overwritten, end - read_seq)
+        return lines, end, dropped
+
+    def close(self):
+        """Release the mapping and, for the owner, remove the block."""
+        self._buf.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def format_message(topic, partition, offset, key, value) -> str:
+    """Format a consumed message as a display line."""
+    return f"[{topic}:{partition}:{offset}] Key: {key}, Value: {json.dumps(value)}"
+
+
+def run_consumer_process(shm_name: str, slots: int, slot_size: int, bootstrap_servers: str,
+                         topics: List[str], group_id: str, position_options: dict, stop_event,
+                         filter_spec: str = ''):
+    """
+    Child process entry point: consume and write display lines into the ring.
+
+    Args:
+        shm_name: Name of the ring's shared memory block
+        slots: Number of ring slots
+        slot_size: Bytes per ring slot
+        bootstrap_servers: Kafka broker address
+        topics: List of topics to consume from
+        group_id: Consumer group ID
+        position_options: Start/stop options for connect_consumer()
+        stop_event: multiprocessing.Event set by the parent to stop consuming
+        filter_spec: Optional MessageFilter spec, compiled in the child
+    """
+    ring = SharedRing.attach(shm_name, slots, slot_size)
+    manager = KafkaManager(bootstrap_servers)
+    message_filter = MessageFilter.parse(filter_spec) if filter_spec else None
+
+    def callback(topic, partition, offset, key, value):
+        ring.write(format_message(topic, partition, offset, key, value))
+
+    async def consume():
+        try:
+            if not await manager.connect_consumer(topics, group_id, **position_options):
+                raise RuntimeError("Failed to start consumer")
+            ring.set_state(STATE_RUNNING)
+            await manager.consume_messages(callback, should_continue=lambda: not stop_event.is_set(),
+                                           message_filter=message_filter)
+        finally:
+            await manager.close_consumer()
+
+    state = STATE_FINISHED
+    try:
+        asyncio.run(consume())
+    except Exception as e:
+        print(f"Error in consumer process: {e}")
+        state = STATE_FAILED
+    finally:
+        ring.set_state(state)
+        ring.close()
+
+
+class ProcessConsumer:
+    """Handle for a consumer running in a child process."""
+
+    def __init__(self, bootstrap_servers: str, topics: List[str], group_id: str = 'test-group',
+                 slots: int = 4096, slot_size: int = 512, filter_spec: str = '', **position_options):
+        """
+        Initialize the handle.
+
+        Args:
+            bootstrap_servers: Kafka broker address
+            topics: List of topics to consume from
+            group_id: Consumer group ID
+            slots: Number of ring slots (lines buffered between polls)
+            slot_size: Bytes per ring slot; longer lines are truncated
+            filter_spec: Optional MessageFilter spec (compiled filters are not picklable)
+            position_options: Start/stop options for connect_consumer()
+        """
+        self.bootstrap_servers = bootstrap_servers
+        self.topics = topics
+        self.group_id = group_id
+        self.slots = slots
+        self.slot_size = slot_size
+        self.filter_spec = filter_spec
+        self.position_options = position_options
+        # spawn avoids forking the parent's Tk and thread state
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._ring: Optional[SharedRing] = None
+        self._process = None
+        self._read_seq = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        """True while the child process is alive."""
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> 'ProcessConsumer':
+        """
+        Create the ring buffer and start the child process.
+
+        Returns:
+            The handle itself, for chaining
+        """
+        self._ring = SharedRing.create(self.slots, self.slot_size)
+        self._process = self._context.Process(
+            target=run_consumer_process,
+            args=(self._ring.name, self.slots, self.slot_size, self.bootstrap_servers,
+                  self.topics, self.group_id, self.position_options, self._stop_event,
+                  self.filter_spec),
+            daemon=True
+        )
+        self._process.start()
+        return self
+
+    def poll(self, limit: Optional[int] = None) -> Tuple[List[str], dict]:
+        """
+        Read new display lines and the current stats.
+
+        Args:
+            limit: Optional maximum number of lines to return per call
+
+        Returns:
+            Tuple of (lines, stats) where stats has messages, dropped and state
+        """
+        if self._ring is None:
+            return [], {'messages': 0, 'dropped': self.dropped, 'state': STATE_STARTING}
+        lines, self._read_seq, dropped = self._ring.read_since(self._read_seq, limit)
+        self.dropped += dropped
+        _, messages, state = self._ring.header()
+        return lines, {'messages': messages, 'dropped': self.dropped, 'state': state}
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """
+        Ask the child process to stop, waiting up to timeout seconds.
+
+        A process that does not exit in time is terminated.
+
+        Args:
+            timeout: Seconds to wait (0 to only request the stop)
+
+        Returns:
+            True if the child process has exited
+        """
+        self._stop_event.set()
+        if self._process is None:
+            return True
+        if timeout:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join(1.0)
+        return not self._process.is_alive()
+
+    def close(self):
+        """Release the ring buffer once the child process has exited."""
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
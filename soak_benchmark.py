@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Soak test asserting bounded memory and stable throughput.
+
+Drives produce/consume through KafkaManager for a configurable duration,
+either against an in-process broker stand-in (default) or a real broker,
+while sampling RSS, live object counts and throughput. Fails when memory
+keeps growing or throughput decays beyond the configured thresholds.
+
+Usage:
+    python3 soak_benchmark.py [--duration 600] [--interval 5]
+        [--max-rss-slope-mb-per-min 1.0] [--max-throughput-decay 0.2]
+        [--broker memory|kafka] [--bootstrap-servers HOST:PORT]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import sys
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from aiokafka import TopicPartition
+
+from kafka_manager import KafkaManager
+
+
+class _Record:
+    """Consumed record with the attributes consume_messages() reads."""
+
+    __slots__ = ('topic', 'partition', 'offset', 'key', 'value', 'timestamp')
+
+    def __init__(self, topic, partition, offset, key, value, timestamp):
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.key = key
+        self.value = value
+        self.timestamp = timestamp
+
+
+class InMemoryBroker:
+    """Single-process broker stand-in with per-partition retention."""
+
+    def __init__(self, partitions: int = 1, retention: int = 10000):
+        """
+        Initialize the broker.
+
+        Args:
+            partitions: Partitions per auto-created topic
+            retention: Messages kept per partition; older messages are dropped
+        """
+        self.partitions = partitions
+        self.retention = retention
+        # (topic, partition) -> [base_offset, deque of (key, value, timestamp_ms)]
+        self.logs: Dict[Tuple[str, int], list] = {}
+        self._data_available: Optional[asyncio.Event] = None
+
+    @property
+    def data_available(self) -> asyncio.Event:
+        """Event set on every append, created on first use inside the running loop."""
+        # Before Python 3.10 an Event binds to the loop current at creation time
+        if self._data_available is None:
+            self._data_available = asyncio.Event()
+        return self._data_available
+
+    def partitions_for(self, topic: str) -> List[int]:
+        """Return the partitions of a topic, creating it on first use."""
+        for partition in range(self.partitions):
+            self.logs.setdefault((topic, partition), [0, deque(maxlen=self.retention)])
+        return list(range(self.partitions))
+
+    def append(self, topic: str, key: Optional[bytes], value: bytes) -> Tuple[int, int]:
+        """
+        Append a message, partitioning by key hash.
+
+        Returns:
+            Tuple of (partition, offset)
+        """
+        partitions = self.partitions_for(topic)
+        partition = hash(key) % len(partitions) if key else 0
+        log = self.logs[(topic, partition)]
+        entries = log[1]
+        if len(entries) == entries.maxlen:
+            log[0] += 1
+        entries.append((key, value, int(time.time() * 1000)))
+        self.data_available.set()
+        return partition, log[0] + len(entries) - 1
+
+    def log_bounds(self, topic: str, partition: int) -> Tuple[int, int]:
+        """Return (beginning offset, end offset) of a partition."""
+        base, entries = self.logs[(topic, partition)]
+        return base, base + len(entries)
+
+    def read(self, topic: str, partition: int, offset: int, limit: int) -> List[tuple]:
+        """Return up to limit (offset, key, value, timestamp) entries from offset."""
+        base, entries = self.logs[(topic, partition)]
+        start = max(offset, base) - base
+        return [(base + i, *entries[i]) for i in range(start, min(len(entries), start + limit))]
+
+
+class StandInProducer:
+    """AIOKafkaProducer stand-in writing to an InMemoryBroker."""
+
+    def __init__(self, broker: InMemoryBroker, bootstrap_servers=None, value_serializer=None,
+                 key_serializer=None, **config):
+        self.broker = broker
+        self.value_serializer = value_serializer or (lambda v: v)
+        self.key_serializer = key_serializer or (lambda k: k)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def send(self, topic, value=None, key=None, partition=None):
+        partition, offset = self.broker.append(topic, self.key_serializer(key), self.value_serializer(value))
+        await asyncio.sleep(0)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result((TopicPartition(topic, partition), offset))
+        return future
+
+    async def send_and_wait(self, topic, value=None, key=None, partition=None):
+        return await (await self.send(topic, value=value, key=key, partition=partition))
+
+
+class StandInConsumer:
+    """AIOKafkaConsumer stand-in reading from an InMemoryBroker."""
+
+    def __init__(self, broker: InMemoryBroker, *topics, bootstrap_servers=None, group_id=None,
+                 value_deserializer=None, key_deserializer=None, auto_offset_reset='earliest',
+                 enable_auto_commit=True, max_poll_records=500, **config):
+        self.broker = broker
+        self.topics = topics
+        self.value_deserializer = value_deserializer or (lambda v: v)
+        self.key_deserializer = key_deserializer or (lambda k: k)
+        self.max_poll_records = max_poll_records
+        self._positions: Dict[TopicPartition, int] = {}
+        self._paused = set()
+
+    async def start(self):
+        for topic in self.topics:
+            for partition in self.broker.partitions_for(topic):
+                tp = TopicPartition(topic, partition)
+                self._positions[tp] = self.broker.log_bounds(topic, partition)[0]
+
+    async def stop(self):
+        pass
+
+    async def commit(self, offsets=None):
+        pass
+
+    def assignment(self):
+        return set(self._positions)
+
+    def paused(self):
+        return set(self._paused)
+
+    def pause(self, *partitions):
+        self._paused.update(partitions)
+
+    def seek(self, tp, offset):
+        self._positions[tp] = offset
+
+    async def seek_to_beginning(self, *partitions):
+        for tp in partitions:
+            self._positions[tp] = self.broker.log_bounds(tp.topic, tp.partition)[0]
+
+    async def position(self, tp):
+        return self._positions[tp]
+
+    async def beginning_offsets(self, partitions):
+        return {tp: self.broker.log_bounds(tp.topic, tp.partition)[0] for tp in partitions}
+
+    async def end_offsets(self, partitions):
+        return {tp: self.broker.log_bounds(tp.topic, tp.partition)[1] for tp in partitions}
+
+    async def getmany(self, timeout_ms=0, max_records=None):
+        limit = max_records or self.max_poll_records
+        batches = self._fetch(limit)
+        if not batches and timeout_ms:
+            self.broker.data_available.clear()
+            try:
+                await asyncio.wait_for(self.broker.data_available.wait(), timeout_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            batches = self._fetch(limit)
+        return batches
+
+    def _fetch(self, limit: int) -> Dict[TopicPartition, List[_Record]]:
+        batches = {}
+        for tp, position in self._positions.items():
+            if tp in self._paused:
+                continue
+            entries = self.broker.read(tp.topic, tp.partition, position, limit)
+            if entries:
+                batches[tp] = [
+                    _Record(tp.topic, tp.partition, offset, self.key_deserializer(key),
+                            self.value_deserializer(value), timestamp)
+                    for offset, key, value, timestamp in entries
+                ]
+                self._positions[tp] = entries[-1][0] + 1
+        return batches
+
+
+def in_process_manager(broker: InMemoryBroker) -> KafkaManager:
+    """
+    Create a KafkaManager whose producer and consumer use the in-process broker.
+
+    Args:
+        broker: Broker stand-in
+
+    Returns:
+        KafkaManager wired to the stand-in clients
+    """
+    manager = KafkaManager('in-process')
+    manager.producer_class = lambda **kwargs: StandInProducer(broker, **kwargs)
+    manager.consumer_class = lambda *topics, **kwargs: StandInConsumer(broker, *topics, **kwargs)
+    return manager
+
+
+def current_rss_mb() -> float:
+    """Return the current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def slope_per_minute(samples: List[dict], field: str) -> float:
+    """Least-squares slope of samples[field] over elapsed time, per minute."""
+    xs = [s['elapsed_sec'] / 60 for s in samples]
+    ys = [s[field] for s in samples]
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def analyze(samples: List[dict], warmup_fraction: float, max_rss_slope: float,
+            max_object_slope: float, max_decay: float) -> dict:
+    """
+    Check the post-warmup samples against the thresholds.
+
+    Args:
+        samples: Periodic samples with elapsed_sec, rss_mb, objects and msgs_per_sec
+        warmup_fraction: Fraction of samples ignored at the start
+        max_rss_slope: Maximum RSS growth in MB per minute
+        max_object_slope: Maximum live object growth per minute
+        max_decay: Maximum relative drop of throughput from the first to the last third
+
+    Returns:
+        Report dictionary with the measured values, 'failures' and 'ok'
+    """
+    steady = samples[int(len(samples) * warmup_fraction):]
+    third = max(1, len(steady) // 3)
+    first = sum(s['msgs_per_sec'] for s in steady[:third]) / third if steady else 0.0
+    last = sum(s['msgs_per_sec'] for s in steady[-third:]) / third if steady else 0.0
+    report = {
+        'samples': len(steady),
+        'rss_slope_mb_per_min': round(slope_per_minute(steady, 'rss_mb'), 4),
+        'object_slope_per_min': round(slope_per_minute(steady, 'objects'), 1),
+        'throughput_first': round(first, 1),
+        'throughput_last': round(last, 1),
+        'throughput_decay': round((first - last) / first, 4) if first else 0.0,
+    }
+
+    failures = []
+    if len(steady) < 3:
+        failures.append("not enough samples after warmup; increase --duration or lower --interval")
+    if report['rss_slope_mb_per_min'] > max_rss_slope:
+        failures.append(f"RSS grows {report['rss_slope_mb_per_min']} MB/min (max {max_rss_slope})")
+    if report['object_slope_per_min'] > max_object_slope:
+        failures.append(f"live objects grow {report['object_slope_per_min']}/min (max {max_object_slope})")
+    if report['throughput_decay'] > max_decay:
+        failures.append(f"throughput decayed {report['throughput_decay']:.1%} (max {max_decay:.0%})")
+    report['failures'] = failures
+    report['ok'] = not failures
+    return report
+
+
+async def soak(manager: KafkaManager, topic: str, duration: float, interval: float,
+               rate: float = 0, log_size: int = 1000) -> List[dict]:
+    """
+    Produce and consume through the manager while sampling resource usage.
+
+    Args:
+        manager: Kafka manager to drive
+        topic: Topic to produce to and consume from
+        duration: Test duration in seconds
+        interval: Seconds between samples
+        rate: Target produce rate in messages/sec (0 = as fast as possible)
+        log_size: Size of the bounded log the consumer callback appends to, like the UIs
+
+    Returns:
+        List of samples
+    """
+    if not await manager.connect_producer():
+        raise RuntimeError("Failed to connect producer")
+    if not await manager.connect_consumer([topic], group_id='soak-test'):
+        raise RuntimeError("Failed to connect consumer")
+
+    log = deque(maxlen=log_size)
+    counts = {'sent': 0, 'received': 0}
+    running = True
+
+    def callback(topic, partition, offset, key, value):
+        counts['received'] += 1
+        log.append(f"[{topic}:{partition}:{offset}] Key: {key}, Value: {json.dumps(value)}")
+
+    async def produce():
+        sequence = 0
+        start = time.perf_counter()
+        while running:
+            sequence += 1
+            key = f"key-{sequence % 3}"
+            message = {"message": f"Soak message {sequence}", "sequence": sequence,
+                       "timestamp": time.time()}
+            if await manager.send_message(topic, message, key):
+                counts['sent'] += 1
+            if rate:
+                delay = start + sequence / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+    consumer_task = asyncio.ensure_future(
+        manager.consume_messages(callback, should_continue=lambda: running)
+    )
+    producer_task = asyncio.ensure_future(produce())
+
+    samples = []
+    start = time.perf_counter()
+    last_time, last_received = start, 0
+    try:
+        while time.perf_counter() - start < duration:
+            await asyncio.sleep(interval)
+            if consumer_task.done() or producer_task.done():
+                break
+            now = time.perf_counter()
+            gc.collect()
+            samples.append({
+                'elapsed_sec': round(now - start, 2),
+                'rss_mb': round(current_rss_mb(), 3),
+                'objects': len(gc.get_objects()),
+                'sent': counts['sent'],
+                'received': counts['received'],
+                'msgs_per_sec': round((counts['received'] - last_received) / (now - last_time), 1),
+            })
+            last_time, last_received = now, counts['received']
+            s = samples[-1]
+            print(f"  t={s['elapsed_sec']:>7}s  rss={s['rss_mb']:>8} MB  objects={s['objects']:>8}  "
+                  f"{s['msgs_per_sec']:>9} msg/s", file=sys.stderr)
+    finally:
+        running = False
+        await asyncio.gather(producer_task, consumer_task, return_exceptions=True)
+        await manager.close()
+
+    for task in (producer_task, consumer_task):
+        if task.done() and not task.cancelled() and task.exception():
+            raise task.exception()
+    return samples
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Soak test KafkaManager for bounded memory and stable throughput.")
+    parser.add_argument('--broker', choices=['memory', 'kafka'], default='memory',
+                        help="In-process broker stand-in or a real broker (default: memory)")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    parser.add_argument('--topic', default='soak-test')
+    parser.add_argument('--duration', type=float, default=600, help="Test duration in seconds")
+    parser.add_argument('--interval', type=float, default=5, help="Seconds between samples")
+    parser.add_argument('--rate', type=float, default=0, help="Produce rate in msg/s (0 = unthrottled)")
+    parser.add_argument('--warmup-fraction', type=float, default=0.2)
+    parser.add_argument('--max-rss-slope-mb-per-min', type=float, default=1.0)
+    parser.add_argument('--max-object-slope-per-min', type=float, default=5000)
+    parser.add_argument('--max-throughput-decay', type=float, default=0.2)
+    parser.add_argument('--json', action='store_true', help="Print samples and report as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    if args.broker == 'memory':
+        manager = in_process_manager(InMemoryBroker())
+    else:
+        manager = KafkaManager(args.bootstrap_servers)
+        manager.run_async(manager.create_topic(args.topic))
+        manager.run_async(manager.close())
+
+    print(f"Soaking {args.broker} broker for {args.duration}s...", file=sys.stderr)
+    try:
+        samples = manager.run_async(soak(manager, args.topic, args.duration, args.interval, args.rate))
+    except Exception as e:
+        print(f"Error running soak test: {e}")
+        sys.exit(1)
+
+    report = analyze(samples, args.warmup_fraction, args.max_rss_slope_mb_per_min,
+                     args.max_object_slope_per_min, args.max_throughput_decay)
+    if args.json:
+        print(json.dumps({'samples': samples, 'report': report}, indent=2))
+    else:
+        print(f"\nRSS slope: {report['rss_slope_mb_per_min']} MB/min, "
+              f"object slope: {report['object_slope_per_min']}/min, "
+              f"throughput {report['throughput_first']} -> {report['throughput_last']} msg/s")
+        for failure in report['failures']:
+            print(f"❌ {failure}")
+        if report['ok']:
+            print("✅ Memory bounded and throughput stable")
+
+    sys.exit(0 if report['ok'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Windowed aggregation of a numeric JSON field over consumed messages.
+
+Records are appended to NumPy column buffers (event time, group, value)
+rather than per-record dicts. A window closes once the watermark passes
+its end. With event time the watermark is the lowest of the per-partition
+highest event times, minus the allowed lateness, so one partition running
+ahead of the others does not close windows the others still feed. With
+arrival time it is simply the latest arrival minus the lateness, so idle
+partitions never hold it back. A closed window's count/sum/mean/min/max/
+percentile per group are computed in one vectorized pass and the rows no
+later window needs are dropped.
+
+Tumbling windows use slide == window; sliding windows use a smaller slide,
+so each record falls into window / slide overlapping windows.
+
+Usage:
+    python3 stream_aggregation.py TOPIC --field '$.amount' [--window 10]
+        [--slide 5] [--group-by key|'$.region'] [--time-field '$.timestamp']
+        [--lateness 2] [--output-topic TOPIC] [--bootstrap-servers HOST:PORT]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from kafka_manager import KafkaManager
+from message_filters import get_field
+from profiling import PROFILER, install_dump_signal
+
+
+def parse_event_time(field) -> Optional[float]:
+    """
+    Convert a timestamp field to epoch seconds.
+
+    Numbers above 1e11 are taken as epoch milliseconds, smaller numbers as
+    epoch seconds; strings are parsed as ISO 8601 (naive times are local).
+
+    Args:
+        field: Timestamp field value
+
+    Returns:
+        Epoch seconds, or None if the field is not a timestamp
+    """
+    if isinstance(field, bool):
+        return None
+    if isinstance(field, (int, float)):
+        return field / 1000.0 if field > 1e11 else float(field)
+    if isinstance(field, str) and field:
+        try:
+            return datetime.fromisoformat(field).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class WindowedAggregator:
+    """Tumbling or sliding window aggregation backed by NumPy arrays."""
+
+    def __init__(self, field: str, window_sec: float = 10.0, slide_sec: Optional[float] = None,
+                 group_by: Optional[str] = 'key', time_field: Optional[str] = None,
+                 allowed_lateness_sec: float = 0.0, percentile: float = 95.0,
+                 initial_capacity: int = 4096):
+        """
+        Initialize an empty aggregator.
+
+        Args:
+            field: JSON path of the numeric field to aggregate, e.g. '$.amount'
+            window_sec: Window length in seconds
+            slide_sec: Slide between window starts; None or window_sec for tumbling windows
+            group_by: 'key' to group by message key, a JSON path to group by a field,
+                or None for a single group
+            time_field: JSON path of the event time (epoch s/ms or ISO string);
+                None uses the arrival time
+            allowed_lateness_sec: How far behind the newest event time records may arrive
+                before their window is closed
+            percentile: Percentile reported per group (nearest rank)
+            initial_capacity: Initial buffer size in records; buffers double when full
+        """
+        slide_sec = slide_sec or window_sec
+        if window_sec <= 0 or slide_sec <= 0 or slide_sec > window_sec:
+            raise ValueError("Window and slide must be positive, with slide <= window")
+
+        self.field = field
+        self.window_sec = float(window_sec)
+        self.slide_sec = float(slide_sec)
+        self.group_by = group_by
+        self.time_field = time_field
+        self.allowed_lateness_sec = allowed_lateness_sec
+        self.percentile = percentile
+        self.percentile_name = f"p{percentile:g}"
+
+        self._times = np.empty(initial_capacity, dtype=np.float64)
+        self._groups = np.empty(initial_capacity, dtype=np.int64)
+        self._values = np.empty(initial_capacity, dtype=np.float64)
+        self._size = 0
+
+        # Groups are interned to small integers so they fit in an array column
+        self._group_ids = {}
+        self._group_names: List[str] = []
+
+        self.watermark = -math.inf
+        self._partition_event_times = {}
+        self._next_window_start: Optional[float] = None
+
+        self.records = 0
+        self.skipped = 0
+        self.late = 0
+
+    def _window_start_containing(self, t: float) -> float:
+        """Start of the earliest window that contains event time t."""
+        return (math.floor((t - self.window_sec) / self.slide_sec) + 1) * self.slide_sec
+
+    def _group_id(self, group) -> int:
+        """Intern a group value."""
+        name = group if isinstance(group, str) else json.dumps(group)
+        group_id = self._group_ids.get(name)
+        if group_id is None:
+            group_id = self._group_ids[name] = len(self._group_names)
+            self._group_names.append(name)
+        return group_id
+
+    def _append(self, t: float, group_id: int, value: float):
+        """Append one row, growing the buffers if needed."""
+        if self._size == len(self._times):
+            capacity = 2 * len(self._times)
+            for name in ('_times', '_groups', '_values'):
+                old = getattr(self, name)
+                new = np.empty(capacity, dtype=old.dtype)
+                new[:self._size] = old[:self._size]
+                setattr(self, name, new)
+        self._times[self._size] = t
+        self._groups[self._size] = group_id
+        self._values[self._size] = value
+        self._size += 1
+
+    def add(self, key, value, partition: Optional[int] = None,
+            arrival_time: Optional[float] = None) -> List[dict]:
+        """
+        Add a consumed message and close any windows the watermark has passed.
+
+        Args:
+            key: Message key
+            value: Decoded message value
+            partition: Source partition, used to track the event-time watermark per partition
+            arrival_time: Arrival time in epoch seconds when no time_field is set
+                (defaults to now)
+
+        Returns:
+            Results of the windows closed by this record (see _aggregate())
+        """
+        number = get_field(value, self.field)
+        if isinstance(number, bool) or not isinstance(number, (int, float)):
+            self.skipped += 1
+            return []
+
+        if self.time_field:
+            t = parse_event_time(get_field(value, self.time_field))
+            if t is None:
+                self.skipped += 1
+                return []
+        else:
+            t = arrival_time if arrival_time is not None else time.time()
+
+        if self._next_window_start is None:
+            self._next_window_start = self._window_start_containing(t)
+        elif t < self._next_window_start:
+            # Every window this record belongs to has already been emitted
+            self.late += 1
+            return []
+
+        if self.group_by == 'key':
+            group = key if key is not None else ''
+        elif self.group_by:
+            group = get_field(value, self.group_by, '')
+        else:
+            group = '*'
+
+        self._append(t, self._group_id(group), float(number))
+        self.records += 1
+
+        if not self.time_field:
+            # Arrival times advance together on every partition
+            self.watermark = max(self.watermark, t - self.allowed_lateness_sec)
+        elif t > self._partition_event_times.get(partition, -math.inf):
+            self._partition_event_times[partition] = t
+            watermark = min(self._partition_event_times.values()) - self.allowed_lateness_sec
+            self.watermark = max(self.watermark, watermark)
+        return self._close_windows(self.watermark, 'consume;callback;aggregate')
+
+    def advance(self, now: Optional[float] = None) -> List[dict]:
+        """
+        Move the watermark forward on processing time, for idle topics.
+
+        Only meaningful without a time_field; with event time the watermark
+        only advances as newer records arrive.
+
+        Args:
+            now: Current epoch seconds (defaults to now)
+
+        Returns:
+            Results of the windows closed
+        """
+        if self.time_field:
+            return []
+        now = now if now is not None else time.time()
+        self.watermark = max(self.watermark, now - self.allowed_lateness_sec)
+        return self._close_windows(self.watermark)
+
+    def flush(self) -> List[dict]:
+        """
+        Close every open window that has data, e.g. when the consumer stops.
+
+        Returns:
+            Results of the windows closed
+        """
+        return self._close_windows(math.inf)
+
+    def _close_windows(self, watermark: float, stage: str = 'consume;aggregate') -> List[dict]:
+        """
+        Emit all windows ending at or before watermark, then compact the buffers.
+
+        Args:
+            watermark: Event time up to which windows are closed
+            stage: Profiling stage; 'consume;callback;aggregate' when called from add(),
+                which runs inside the consumer callback
+        """
+        results = []
+        if self._next_window_start is None:
+            return results
+
+        while self._next_window_start + self.window_sec <= watermark:
+            start = self._next_window_start
+            times = self._times[:self._size]
+            if self._size == 0 or times.min() >= start + self.window_sec:
+                # Nothing in this window: jump to the first window holding data
+                if self._size == 0:
+                    if math.isinf(watermark):
+                        break
+                    start = self._window_start_containing(watermark)
+                    self._next_window_start = max(self._next_window_start, start)
+                    break
+                self._next_window_start = max(
+                    self._next_window_start + self.slide_sec,
+                    self._window_start_containing(times.min())
+                )
+                continue
+
+            token = PROFILER.begin(stage) if PROFILER.enabled else 0
+            results.extend(self._aggregate(start, start + self.window_sec))
+            if token:
+                PROFILER.end(stage, token)
+            self._next_window_start = start + self.slide_sec
+
+            # Rows before the next window start belong to no open window
+            keep = times >= self._next_window_start
+            kept = int(keep.sum())
+            if kept < self._size:
+                self._times[:kept] = times[keep]
+                self._groups[:kept] = self._groups[:self._size][keep]
+                self._values[:kept] = self._values[:self._size][keep]
+                self._size = kept
+        return results
+
+    def _aggregate(self, start: float, end: float) -> List[dict]:
+        """
+        Aggregate the rows of one window per group.
+
+        Returns:
+            One dict per group with window_start, window_end, group, count, sum,
+            mean, min, max and the configured percentile (e.g. 'p95')
+        """
+        times = self._times[:self._size]
+        mask = (times >= start) & (times < end)
+        if not mask.any():
+            return []
+        groups = self._groups[:self._size][mask]
+        values = self._values[:self._size][mask]
+
+        # Sort by group, then value, so each group is a contiguous sorted run
+        order = np.lexsort((values, groups))
+        groups = groups[order]
+        values = values[order]
+        group_ids, firsts, counts = np.unique(groups, return_index=True, return_counts=True)
+        sums = np.add.reduceat(values, firsts)
+        lasts = firsts + counts - 1
+        ranks = firsts + np.maximum(np.ceil(self.percentile / 100.0 * counts).astype(np.int64) - 1, 0)
+
+        return [
+            {
+                'window_start': start,
+                'window_end': end,
+                'group': self._group_names[group_id],
+                'count': int(count),
+                'sum': float(total),
+                'mean': float(total / count),
+                'min': float(values[first]),
+                'max': float(values[last]),
+                self.percentile_name: float(values[rank]),
+            }
+            for group_id, first, last, rank, count, total
+            in zip(group_ids, firsts, lasts, ranks, counts, sums)
+        ]
+
+    def format_result(self, result: dict) -> str:
+        """Format a window result as a display line."""
+        start = datetime.fromtimestamp(result['window_start']).strftime("%H:%M:%S")
+        end = datetime.fromtimestamp(result['window_end']).strftime("%H:%M:%S")
+        return (f"[{start}-{end}] {self.group_by or 'all'}={result['group']} {self.field}: "
+                f"count={result['count']} sum={result['sum']:g} mean={result['mean']:.4g} "
+                f"min={result['min']:g} max={result['max']:g} "
+                f"{self.percentile_name}={result[self.percentile_name]:g}")
+
+
+def aggregating_callback(aggregator: WindowedAggregator, on_results: Callable[[List[dict]], None],
+                         callback: Optional[Callable] = None) -> Callable:
+    """
+    Wrap a consume_messages() callback so every message also feeds the aggregator.
+
+    Args:
+        aggregator: Aggregator to feed
+        on_results: Called with the results of each batch of closed windows
+        callback: Optional inner callback(topic, partition, offset, key, value)
+
+    Returns:
+        A callback for consume_messages() / ConsumerSession
+    """
+    def wrapped(topic, partition, offset, key, value):
+        if callback is not None:
+            callback(topic, partition, offset, key, value)
+        results = aggregator.add(key, value, partition)
+        if results:
+            on_results(results)
+
+    return wrapped
+
+
+async def run_aggregation(bootstrap_servers: str, topics: List[str], aggregator: WindowedAggregator,
+                          output_topic: Optional[str] = None, group_id: Optional[str] = None,
+                          duration: Optional[float] = None, **position_options):
+    """
+    Consume topics, print window results and optionally produce them to an output topic.
+
+    Args:
+        bootstrap_servers: Kafka broker address
+        topics: Topics to aggregate
+        aggregator: Configured aggregator
+        output_topic: Topic to produce results to, keyed by group
+        group_id: Consumer group ID (None to read without committing)
+        duration: Optional number of seconds to run for
+        position_options: Start/stop options for connect_consumer()
+    """
+    manager = KafkaManager(bootstrap_servers)
+    pending: asyncio.Queue = asyncio.Queue()
+    deadline = time.monotonic() + duration if duration else None
+
+    def emit(results):
+        for result in results:
+            print(aggregator.format_result(result))
+            if output_topic:
+                pending.put_nowait(result)
+
+    async def forward():
+        while True:
+            result = await pending.get()
+            try:
+                if not await manager.send_message(output_topic, result, result['group']):
+                    print(f"Failed to forward window result to {output_topic}")
+            finally:
+                pending.task_done()
+
+    def should_continue():
+        # Close idle windows on processing time between polls
+        emit(aggregator.advance())
+        return deadline is None or time.monotonic() < deadline
+
+    forwarder = asyncio.ensure_future(forward()) if output_topic else None
+    try:
+        if output_topic and not await manager.connect_producer():
+            raise RuntimeError("Failed to connect producer")
+        if not await manager.connect_consumer(topics, group_id, **position_options):
+            raise RuntimeError("Failed to start consumer")
+        await manager.consume_messages(aggregating_callback(aggregator, emit),
+                                       should_continue=should_continue)
+        emit(aggregator.flush())
+        if forwarder:
+            await pending.join()
+    finally:
+        if forwarder:
+            forwarder.cancel()
+        await manager.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Windowed aggregation of a JSON field over a topic.")
+    parser.add_argument('topics', help="Comma-separated topics to aggregate")
+    parser.add_argument('--field', required=True, help="JSON path of the numeric field, e.g. '$.amount'")
+    parser.add_argument('--window', type=float, default=10.0, help="Window length in seconds")
+    parser.add_argument('--slide', type=float, help="Slide in seconds (default: tumbling windows)")
+    parser.add_argument('--group-by', default='key', help="'key', a JSON path, or 'none'")
+    parser.add_argument('--time-field', help="JSON path of the event time (default: arrival time)")
+    parser.add_argument('--lateness', type=float, default=0.0, help="Allowed lateness in seconds")
+    parser.add_argument('--percentile', type=float, default=95.0)
+    parser.add_argument('--output-topic', help="Produce window results to this topic")
+    parser.add_argument('--group-id', help="Consumer group ID (default: no group, read from the earliest offset)")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--bootstrap-servers', default=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'))
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    install_dump_signal()
+    aggregator = WindowedAggregator(
+        field=args.field,
+        window_sec=args.window,
+        slide_sec=args.slide,
+        group_by=None if args.group_by == 'none' else args.group_by,
+        time_field=args.time_field,
+        allowed_lateness_sec=args.lateness,
+        percentile=args.percentile,
+    )
+    topics = [t.strip() for t in args.topics.split(',') if t.strip()]
+    try:
+        asyncio.run(run_aggregation(args.bootstrap_servers, topics, aggregator,
+                                    output_topic=args.output_topic, group_id=args.group_id,
+                                    duration=args.duration))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error running aggregation: {e}")
+        sys.exit(1)
+    print(f"Aggregated {aggregator.records} records "
+          f"({aggregator.skipped} without a numeric field, {aggregator.late} late)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Tests for the consumer start/stop position helpers in kafka_manager."""
+from datetime import datetime
+
+import pytest
+
+from kafka_manager import consumer_position_options, parse_partition_offsets, parse_timestamp_ms
+
+
+def test_parse_partition_offsets():
+    assert parse_partition_offsets('0:100, 1:250') == {0: 100, 1: 250}
+    assert parse_partition_offsets('orders:0:100') == {('orders', 0): 100}
+    assert parse_partition_offsets('') == {}
+
+
+@pytest.mark.parametrize('text', ['100', '0:x'])
+def test_parse_partition_offsets_invalid(text):
+    with pytest.raises(ValueError):
+        parse_partition_offsets(text)
+
+
+def test_parse_timestamp_ms():
+    assert parse_timestamp_ms(' 1700000000000 ') == 1700000000000
+    assert parse_timestamp_ms('2024-01-31T12:00:00+00:00') == 1706702400000
+    assert parse_timestamp_ms('2024-01-31T12:00:00') == int(datetime(2024, 1, 31, 12).timestamp() * 1000)
+    with pytest.raises(ValueError):
+        parse_timestamp_ms('yesterday')
+
+
+@pytest.mark.parametrize('args, expected', [
+    (('earliest', '', 'none', ''), {}),
+    (('latest', '', 'none', ''), {'last_n': 0}),
+    (('last N', '50', 'none', ''), {'last_n': 50}),
+    (('offsets', '0:10', 'offsets', '0:20'), {'start_offsets': {0: 10}, 'stop_offsets': {0: 20}}),
+    (('timestamp', '1700000000000', 'timestamp', '1700000060000'),
+     {'start_timestamp_ms': 1700000000000, 'stop_timestamp_ms': 1700000060000}),
+])
+def test_consumer_position_options(args, expected):
+    assert consumer_position_options(*args) == expected
+
+
+@pytest.mark.parametrize('args', [
+    ('sometime', '', 'none', ''),
+    ('earliest', '', 'never', ''),
+    ('last N', 'many', 'none', ''),
+])
+def test_consumer_position_options_invalid(args):
+    with pytest.raises(ValueError):
+        consumer_position_options(*args)
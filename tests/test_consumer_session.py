@@ -0,0 +1,170 @@
+"""Tests for KafkaManager.consume_messages() and ConsumerSession against the in-process broker."""
+import asyncio
+import threading
+import time
+
+from aiokafka import TopicPartition
+
+from kafka_manager import ConsumerSession
+from message_filters import MessageFilter
+from soak_benchmark import InMemoryBroker, StandInConsumer, in_process_manager
+
+
+class MarkerConsumer(StandInConsumer):
+    """Stand-in whose logs end in an undelivered offset, like a transaction commit marker."""
+
+    def _fetch(self, limit):
+        batches = super()._fetch(limit)
+        for tp, position in self._positions.items():
+            end = self.broker.log_bounds(tp.topic, tp.partition)[1]
+            if position == end:
+                # Step over the marker, as a real consumer does after fetching it
+                self._positions[tp] = end + 1
+        return batches
+
+
+def produce(manager, topic, count):
+    async def send_all():
+        await manager.connect_producer()
+        for i in range(count):
+            await manager.send_message(topic, {'i': i}, f"k{i}")
+    asyncio.run(send_all())
+
+
+def consume(manager, topics, callback, group_id=None, max_polls=20, message_filter=None, **options):
+    """Connect and consume until the read ends or max_polls polls have run."""
+    polls = 0
+
+    def should_continue():
+        nonlocal polls
+        polls += 1
+        return polls <= max_polls
+
+    async def run():
+        assert await manager.connect_consumer(topics, group_id, **options)
+        await manager.consume_messages(callback, should_continue=should_continue, poll_timeout_ms=10,
+                                       message_filter=message_filter)
+        return polls
+
+    return asyncio.run(run())
+
+
+def test_bounded_read_stops_at_stop_offset():
+    manager = in_process_manager(InMemoryBroker())
+    produce(manager, 't', 10)
+    seen = []
+    polls = consume(manager, ['t'], lambda *args: seen.append(args[2]),
+                    start_offsets={0: 2}, stop_offsets={0: 5})
+    assert seen == [2, 3, 4]
+    assert polls < 20
+
+
+def test_bounded_read_finishes_past_undelivered_offsets():
+    broker = InMemoryBroker()
+    manager = in_process_manager(broker)
+    produce(manager, 't', 5)
+    manager.consumer_class = lambda *topics, **kwargs: MarkerConsumer(broker, *topics, **kwargs)
+    seen = []
+    # Offset 5 is the marker: the end offset a stop timestamp past the end resolves to is 6
+    polls = consume(manager, ['t'], lambda *args: seen.append(args[2]),
+                    start_offsets={0: 0}, stop_offsets={0: 6})
+    assert seen == [0, 1, 2, 3, 4]
+    assert polls < 20
+
+
+class RecordingConsumer(StandInConsumer):
+    """Stand-in that records the partitions it fetches and the positions it commits."""
+
+    fetched = set()
+    committed = {}
+
+    def _fetch(self, limit):
+        batches = super()._fetch(limit)
+        RecordingConsumer.fetched.update(batches)
+        return batches
+
+    async def commit(self, offsets=None):
+        RecordingConsumer.committed = dict(self._positions)
+
+
+def recording_manager(partitions=1):
+    broker = InMemoryBroker(partitions=partitions)
+    manager = in_process_manager(broker)
+    RecordingConsumer.fetched = set()
+    RecordingConsumer.committed = {}
+    manager.consumer_class = lambda *topics, **kwargs: RecordingConsumer(broker, *topics, **kwargs)
+    return manager
+
+
+def run_session(manager, callback, **options):
+    """Run a ConsumerSession until it finishes, returning the error it ended with."""
+    finished = threading.Event()
+    errors = []
+
+    def on_finished(error):
+        errors.append(error)
+        finished.set()
+
+    session = ConsumerSession(manager, ['t'], callback, on_finished=on_finished,
+                              poll_timeout_ms=10, **options).start()
+    assert finished.wait(5)
+    session.stop()
+    return errors[0]
+
+
+def test_session_stops_promptly_when_idle():
+    manager = recording_manager()
+    polls = []
+    session = ConsumerSession(manager, ['t'], lambda *args: None, poll_timeout_ms=50,
+                              on_poll=lambda: polls.append(time.monotonic())).start()
+    time.sleep(0.3)
+    started = time.monotonic()
+    assert session.stop(timeout=2)
+    assert time.monotonic() - started < 1
+    assert len(polls) >= 3
+    assert not session.running
+
+
+def test_failed_callback_commits_only_processed_records():
+    manager = recording_manager(partitions=3)
+    produce(manager, 't', 30)
+    seen = {}
+
+    def callback(topic, partition, offset, key, value):
+        if sum(seen.values()) == 12:
+            raise ValueError("boom")
+        seen[partition] = seen.get(partition, 0) + 1
+
+    error = run_session(manager, callback)
+    assert isinstance(error, ValueError)
+    # Records are read from offset 0 in order, so the next position equals the count processed
+    assert {tp.partition: offset for tp, offset in RecordingConsumer.committed.items()} == {
+        partition: seen.get(partition, 0) for partition in range(3)
+    }
+
+
+def test_completed_session_commits_everything():
+    manager = recording_manager()
+    produce(manager, 't', 5)
+    seen = []
+
+    def callback(*args):
+        seen.append(args[2])
+        if len(seen) == 5:
+            session_done.set()
+
+    session_done = threading.Event()
+    session = ConsumerSession(manager, ['t'], callback, poll_timeout_ms=10).start()
+    assert session_done.wait(5)
+    assert session.stop()
+    assert RecordingConsumer.committed == {TopicPartition('t', 0): 5}
+
+
+def test_excluded_partitions_are_never_fetched():
+    manager = recording_manager(partitions=3)
+    produce(manager, 't', 30)
+    seen = []
+    consume(manager, ['t'], lambda *args: seen.append(args[1]), group_id='g', max_polls=5,
+            message_filter=MessageFilter.parse('partition=1'))
+    assert seen and set(seen) == {1}
+    assert {tp.partition for tp in RecordingConsumer.fetched} == {1}
@@ -0,0 +1,73 @@
+"""Tests for message_filters.MessageFilter."""
+import pytest
+
+from message_filters import MessageFilter, get_field
+
+
+def test_empty_spec_gives_no_filter():
+    assert MessageFilter.parse('') is None
+    assert MessageFilter.parse(' ; ; ') is None
+
+
+def test_key_terms():
+    assert MessageFilter.parse('key=user-1').match_raw(0, b'user-1', b'{}')
+    assert not MessageFilter.parse('key=user-1').match_raw(0, b'user-10', b'{}')
+    assert MessageFilter.parse('key^=user-').match_raw(0, b'user-10', b'{}')
+    assert not MessageFilter.parse('key^=user-').match_raw(0, None, b'{}')
+    assert MessageFilter.parse('key~=\\d+$').match_raw(0, b'user-10', b'{}')
+
+
+def test_partition_term():
+    message_filter = MessageFilter.parse('partition=0,2')
+    assert message_filter.partitions == frozenset({0, 2})
+    assert message_filter.match_raw(2, None, b'{}')
+    assert not message_filter.match_raw(1, None, b'{}')
+    assert MessageFilter.parse('key=a').partitions is None
+
+
+def test_contains_matches_raw_bytes():
+    message_filter = MessageFilter.parse('contains=ERROR')
+    assert message_filter.match_raw(0, None, b'{"level": "ERROR"}')
+    assert not message_filter.match_raw(0, None, b'{"level": "INFO"}')
+    assert not message_filter.match_raw(0, None, None)
+
+
+@pytest.mark.parametrize('spec, value, expected', [
+    ('$.status==failed', {'status': 'failed'}, True),
+    ('$.status==failed', {'status': 'ok'}, False),
+    ('$.status!=failed', {'status': 'ok'}, True),
+    ('$.amount>100', {'amount': 150}, True),
+    ('$.amount>100', {'amount': 'lots'}, False),
+    ('$.amount<=100', {'amount': 100}, True),
+    ('$.user.name~=^a', {'user': {'name': 'alice'}}, True),
+    ('$.items.0==1', {'items': [1, 2]}, True),
+    ('$.items.-1==2', {'items': [1, 2]}, True),
+    ('$.missing', {'other': 1}, False),
+    ('$.other', {'other': 1}, True),
+])
+def test_json_predicates(spec, value, expected):
+    assert MessageFilter.parse(spec).match_value(value) is expected
+
+
+def test_all_terms_must_match():
+    message_filter = MessageFilter.parse('key^=user-; $.amount>100')
+    assert message_filter.match_raw(0, b'user-1', b'{}')
+    assert not message_filter.match_value({'amount': 50})
+    assert message_filter.match_value({'amount': 150})
+
+
+@pytest.mark.parametrize('spec', ['bogus=1', '$.a b', 'key~=(', 'partition=x'])
+def test_invalid_specs_raise_value_error(spec):
+    with pytest.raises(ValueError):
+        MessageFilter.parse(spec)
+
+
+def test_keeps_whole_keys():
+    assert MessageFilter.parse('key^=a; partition=1').keeps_whole_keys()
+    assert not MessageFilter.parse('contains=x').keeps_whole_keys()
+    assert not MessageFilter.parse('$.a>1').keeps_whole_keys()
+
+
+def test_get_field():
+    assert get_field({'a': {'b': 1}}, '$.a.b') == 1
+    assert get_field({'a': 1}, '$.b', 'default') == 'default'
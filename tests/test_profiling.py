@@ -0,0 +1,59 @@
+"""Tests for profiling.StageProfiler."""
+import time
+
+from profiling import StageProfiler
+
+
+def record(profiler, stage, ms):
+    """Record one call of stage lasting about ms milliseconds."""
+    token = profiler.begin(stage)
+    profiler.end(stage, token - int(ms * 1e6))
+
+
+def parse_collapsed(text):
+    return {stage: int(us) for stage, us in (line.rsplit(' ', 1) for line in text.splitlines())}
+
+
+def test_collapsed_subtracts_child_time_from_parent():
+    profiler = StageProfiler()
+    profiler.enable()
+    record(profiler, 'consume;callback', 10)
+    record(profiler, 'consume;callback;aggregate', 4)
+    record(profiler, 'consume;callback;sequence_check', 1)
+    stacks = parse_collapsed(profiler.collapsed())
+    assert 5000 <= stacks['consume;callback'] < 5100
+    assert 4000 <= stacks['consume;callback;aggregate'] < 4100
+    assert 1000 <= stacks['consume;callback;sequence_check'] < 1100
+
+
+def test_collapsed_keeps_siblings_independent():
+    profiler = StageProfiler()
+    profiler.enable()
+    record(profiler, 'produce;send_and_wait', 3)
+    record(profiler, 'produce;serialize', 2)
+    stacks = parse_collapsed(profiler.collapsed())
+    assert 3000 <= stacks['produce;send_and_wait'] < 3100
+    assert 2000 <= stacks['produce;serialize'] < 2100
+
+
+def test_sampling_scales_totals_to_all_calls():
+    profiler = StageProfiler()
+    profiler.enable(sample_every=2)
+    for _ in range(4):
+        token = profiler.begin('stage')
+        if token:
+            profiler.end('stage', token - 1000000)
+    [row] = profiler.breakdown()
+    assert row['calls'] == 4
+    assert row['sampled'] == 2
+    assert 4.0 <= row['est_total_ms'] < 4.5
+
+
+def test_disabled_profiler_records_nothing_through_the_hook_pattern():
+    profiler = StageProfiler()
+    token = profiler.begin('stage') if profiler.enabled else 0
+    time.sleep(0)
+    if token:
+        profiler.end('stage', token)
+    assert profiler.breakdown() == []
+    assert profiler.collapsed() == ''
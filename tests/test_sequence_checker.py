@@ -0,0 +1,106 @@
+"""Tests for sequence_checker.SequenceChecker."""
+from sequence_checker import SequenceChecker, checking_callback
+
+
+def message(sequence, producer='p1'):
+    return {'producer_id': producer, 'sequence': sequence}
+
+
+def events(checker, sequences, key='k', topic='t'):
+    return [checker.check(key, message(s), topic)[0] for s in sequences]
+
+
+def test_in_order_stream():
+    checker = SequenceChecker()
+    assert events(checker, [1, 2, 3]) == ['new', 'ok', 'ok']
+    assert checker.metrics()['streams'] == 1
+
+
+def test_gap_then_reorder():
+    checker = SequenceChecker()
+    assert events(checker, [1, 4, 2, 3, 5]) == ['new', 'gap', 'reorder', 'reorder', 'ok']
+    assert checker.gaps == 1
+    assert checker.reorders == 2
+    assert checker.missing == 0
+
+
+def test_gap_leaves_missing_count():
+    checker = SequenceChecker()
+    event, detail = checker.check('k', message(1))
+    event, detail = checker.check('k', message(5))
+    assert event == 'gap'
+    assert detail == "expected 2, got 5 (3 missing)"
+    assert checker.missing == 3
+
+
+def test_duplicates():
+    checker = SequenceChecker()
+    assert events(checker, [1, 2, 2, 1, 3]) == ['new', 'ok', 'duplicate', 'duplicate', 'ok']
+    assert checker.duplicates == 2
+
+
+def test_streams_are_per_producer_and_key():
+    checker = SequenceChecker()
+    assert checker.check('a', message(1, 'p1'))[0] == 'new'
+    assert checker.check('b', message(1, 'p1'))[0] == 'new'
+    assert checker.check('a', message(1, 'p2'))[0] == 'new'
+    assert checker.check('a', message(2, 'p1'))[0] == 'ok'
+    assert checker.streams == 3
+
+
+def test_broadcast_copies_are_not_duplicates():
+    # Regression: copies of a message fanned out to several topics share
+    # producer and key, and used to be reported as duplicates
+    checker = SequenceChecker()
+    for sequence in (1, 2, 3):
+        for topic in ('orders-eu', 'orders-us'):
+            checker.check('k', message(sequence), topic)
+    assert checker.duplicates == 0
+    assert checker.streams == 2
+
+
+def test_unsequenced_messages_are_counted():
+    checker = SequenceChecker()
+    assert checker.check('k', {'sequence': 'one'}) == (None, None)
+    assert checker.check('k', {'sequence': True}) == (None, None)
+    assert checker.check('k', None) == (None, None)
+    assert checker.unsequenced == 3
+    assert checker.checked == 0
+
+
+def test_lru_eviction_restarts_stream():
+    checker = SequenceChecker(max_streams=2)
+    checker.check('a', message(1))
+    checker.check('b', message(1))
+    checker.check('a', message(2))
+    checker.check('c', message(1))  # evicts 'b', the least recently used
+    assert checker.evicted == 1
+    assert checker.check('a', message(3))[0] == 'ok'
+    assert checker.check('b', message(2))[0] == 'new'
+
+
+def test_max_missing_bounds_remembered_gaps():
+    checker = SequenceChecker(max_missing=2)
+    # Skipped sequences beyond max_missing are forgotten
+    assert events(checker, [1, 10, 9, 2]) == ['new', 'gap', 'reorder', 'duplicate']
+
+
+def test_reset():
+    checker = SequenceChecker()
+    events(checker, [1, 3])
+    checker.reset()
+    assert checker.metrics() == {
+        'checked': 0, 'unsequenced': 0, 'gaps': 0, 'missing': 0,
+        'duplicates': 0, 'reorders': 0, 'streams': 0, 'evicted': 0,
+    }
+
+
+def test_checking_callback_reports_anomalies():
+    checker = SequenceChecker()
+    received, anomalies = [], []
+    callback = checking_callback(checker, lambda event, text: anomalies.append(event),
+                                 lambda *args: received.append(args))
+    for offset, sequence in enumerate([1, 3, 3]):
+        callback('t', 0, offset, 'k', message(sequence))
+    assert len(received) == 3
+    assert anomalies == ['gap', 'duplicate']
@@ -0,0 +1,62 @@
+"""Tests for shm_consumer.SharedRing."""
+import pytest
+
+pytest.importorskip('multiprocessing.shared_memory')
+
+from shm_consumer import STATE_RUNNING, SharedRing  # noqa: E402
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing.create(slots=4, slot_size=32)
+    yield ring
+    ring.close()
+
+
+def test_read_since_returns_new_lines(ring):
+    ring.write('one')
+    ring.write('two')
+    lines, read_seq, dropped = ring.read_since(0)
+    assert (lines, read_seq, dropped) == (['one', 'two'], 2, 0)
+
+    ring.write('three')
+    assert ring.read_since(read_seq) == (['three'], 3, 0)
+    assert ring.read_since(3) == ([], 3, 0)
+
+
+def test_read_since_limit(ring):
+    for line in 'abc':
+        ring.write(line)
+    assert ring.read_since(0, limit=2) == (['a', 'b'], 2, 0)
+    assert ring.read_since(2, limit=2) == (['c'], 3, 0)
+
+
+def test_lapped_reader_reports_dropped_lines(ring):
+    for i in range(7):
+        ring.write(str(i))
+    lines, read_seq, dropped = ring.read_since(0)
+    assert lines == ['3', '4', '5', '6']
+    assert read_seq == 7
+    assert dropped == 3
+
+
+def test_long_lines_are_truncated(ring):
+    ring.write('x' * 100)
+    [line], _, _ = ring.read_since(0)
+    assert line == 'x' * 28
+
+
+def test_header_counts_messages_and_state(ring):
+    ring.write('a')
+    ring.set_state(STATE_RUNNING)
+    ring.write('b')
+    assert ring.header() == (2, 2, STATE_RUNNING)
+
+
+def test_attach_sees_writes(ring):
+    reader = SharedRing.attach(ring.name, ring.slots, ring.slot_size)
+    try:
+        ring.write('shared')
+        assert reader.read_since(0)[0] == ['shared']
+    finally:
+        reader.close()
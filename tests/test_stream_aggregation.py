@@ -0,0 +1,125 @@
+"""Tests for stream_aggregation.WindowedAggregator."""
+import pytest
+
+from stream_aggregation import WindowedAggregator, parse_event_time
+
+
+def test_tumbling_window_per_key():
+    aggregator = WindowedAggregator('$.amount', window_sec=10)
+    assert aggregator.add('a', {'amount': 1}, arrival_time=100) == []
+    assert aggregator.add('a', {'amount': 3}, arrival_time=105) == []
+    assert aggregator.add('b', {'amount': 10}, arrival_time=109) == []
+
+    results = aggregator.add('a', {'amount': 7}, arrival_time=110)
+    assert [(r['window_start'], r['group'], r['count'], r['sum']) for r in results] == [
+        (100.0, 'a', 2, 4.0),
+        (100.0, 'b', 1, 10.0),
+    ]
+    assert results[0]['min'] == 1.0
+    assert results[0]['max'] == 3.0
+    assert results[0]['mean'] == 2.0
+    assert results[0]['p95'] == 3.0
+
+
+def test_sliding_windows_overlap():
+    aggregator = WindowedAggregator('$.v', window_sec=10, slide_sec=5, group_by=None)
+    results = []
+    for t in (100, 103, 106, 115):
+        results.extend(aggregator.add(None, {'v': 1}, arrival_time=t))
+    assert [(r['window_start'], r['count']) for r in results] == [(95.0, 2), (100.0, 3), (105.0, 1)]
+
+
+def test_flush_emits_open_windows():
+    aggregator = WindowedAggregator('$.v', window_sec=10, group_by='$.region')
+    aggregator.add('k', {'v': 2, 'region': 'EU'}, arrival_time=100)
+    aggregator.add('k', {'v': 4, 'region': 'US'}, arrival_time=101)
+    results = aggregator.flush()
+    assert sorted((r['group'], r['sum']) for r in results) == [('EU', 2.0), ('US', 4.0)]
+    assert aggregator.flush() == []
+
+
+def test_late_records_are_counted_and_dropped():
+    aggregator = WindowedAggregator('$.v', window_sec=10, time_field='$.ts')
+    aggregator.add('k', {'v': 1, 'ts': 100}, partition=0)
+    assert len(aggregator.add('k', {'v': 1, 'ts': 120}, partition=0)) == 1
+    assert aggregator.add('k', {'v': 1, 'ts': 105}, partition=0) == []
+    assert aggregator.late == 1
+
+
+def test_allowed_lateness_keeps_window_open():
+    aggregator = WindowedAggregator('$.v', window_sec=10, time_field='$.ts', allowed_lateness_sec=5)
+    aggregator.add('k', {'v': 1, 'ts': 100}, partition=0)
+    assert aggregator.add('k', {'v': 1, 'ts': 112}, partition=0) == []
+    assert aggregator.add('k', {'v': 1, 'ts': 108}, partition=0) == []
+    results = aggregator.add('k', {'v': 1, 'ts': 115}, partition=0)
+    assert [(r['window_start'], r['count']) for r in results] == [(100.0, 2)]
+    assert aggregator.late == 0
+
+
+def test_event_time_waits_for_slowest_partition():
+    aggregator = WindowedAggregator('$.v', window_sec=10, time_field='$.ts')
+    aggregator.add('k', {'v': 1, 'ts': 100}, partition=1)
+    assert aggregator.add('k', {'v': 1, 'ts': 150}, partition=0) == []
+    results = aggregator.add('k', {'v': 1, 'ts': 150}, partition=1)
+    assert [r['window_start'] for r in results] == [100.0]
+
+
+def test_arrival_time_not_held_back_by_idle_partition():
+    # Regression: an idle partition used to pin the watermark to its one record
+    aggregator = WindowedAggregator('$.v', window_sec=10)
+    aggregator.add('k', {'v': 1}, partition=1, arrival_time=100)
+    emitted = []
+    for i in range(100):
+        emitted.extend(aggregator.add('k', {'v': 1}, partition=0, arrival_time=101 + i * 10))
+    # Every window before the newest record's is closed
+    assert len(emitted) == 99
+    assert emitted[0]['count'] == 2
+    assert aggregator.watermark == 1091
+
+
+def test_advance_closes_windows_on_idle_topic():
+    aggregator = WindowedAggregator('$.v', window_sec=10)
+    aggregator.add('k', {'v': 5}, arrival_time=100)
+    assert aggregator.advance(now=105) == []
+    results = aggregator.advance(now=110)
+    assert [(r['window_start'], r['sum']) for r in results] == [(100.0, 5.0)]
+
+
+def test_advance_ignored_with_event_time():
+    aggregator = WindowedAggregator('$.v', window_sec=10, time_field='$.ts')
+    aggregator.add('k', {'v': 5, 'ts': 100}, partition=0)
+    assert aggregator.advance(now=10 ** 10) == []
+
+
+def test_non_numeric_values_are_skipped():
+    aggregator = WindowedAggregator('$.v', window_sec=10)
+    aggregator.add('k', {'v': 'x'}, arrival_time=100)
+    aggregator.add('k', {'v': True}, arrival_time=100)
+    aggregator.add('k', {}, arrival_time=100)
+    assert aggregator.skipped == 3
+    assert aggregator.records == 0
+
+
+def test_buffers_grow_past_initial_capacity():
+    aggregator = WindowedAggregator('$.v', window_sec=10, group_by=None, initial_capacity=2)
+    for i in range(10):
+        aggregator.add(None, {'v': i}, arrival_time=100)
+    [result] = aggregator.flush()
+    assert result['count'] == 10
+    assert result['sum'] == 45.0
+
+
+def test_invalid_window_rejected():
+    with pytest.raises(ValueError):
+        WindowedAggregator('$.v', window_sec=10, slide_sec=20)
+
+
+@pytest.mark.parametrize('field, expected', [
+    (1700000000, 1700000000.0),
+    (1700000000000, 1700000000.0),
+    ('2024-01-31T12:00:00+00:00', 1706702400.0),
+    ('not a time', None),
+    (None, None),
+])
+def test_parse_event_time(field, expected):
+    assert parse_event_time(field) == expected
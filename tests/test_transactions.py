@@ -0,0 +1,148 @@
+"""Tests for KafkaManager.send_transaction() and transform_messages() with a transactional stand-in."""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from aiokafka import TopicPartition
+
+from eos_benchmark import add_overhead
+from soak_benchmark import InMemoryBroker, StandInProducer, in_process_manager
+
+
+class TransactionalProducer(StandInProducer):
+    """Stand-in that buffers sends in a transaction and appends them only on commit."""
+
+    def __init__(self, broker, fail_on=None, **config):
+        super().__init__(broker, **config)
+        self.fail_on = fail_on
+        self.pending = None
+        self.committed_offsets = []
+        self.aborted = 0
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.pending = []
+        try:
+            yield
+        except BaseException:
+            self.aborted += 1
+            raise
+        else:
+            for topic, value, key in self.pending:
+                await super().send(topic, value=value, key=key)
+        finally:
+            self.pending = None
+
+    async def send(self, topic, value=None, key=None, partition=None):
+        if self.fail_on is not None and self.fail_on(value):
+            raise RuntimeError("send failed")
+        if self.pending is None:
+            return await super().send(topic, value=value, key=key, partition=partition)
+        self.pending.append((topic, value, key))
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    async def send_offsets_to_transaction(self, offsets, group_id):
+        self.committed_offsets.append((dict(offsets), group_id))
+
+
+def transactional_manager(fail_on=None):
+    broker = InMemoryBroker()
+    manager = in_process_manager(broker)
+    manager.producer_class = lambda **kwargs: TransactionalProducer(broker, fail_on=fail_on, **kwargs)
+    return broker, manager
+
+
+def topic_values(broker, topic):
+    if (topic, 0) not in broker.logs:
+        return []
+    return [value for _, _, value, _ in broker.read(topic, 0, 0, 1000)]
+
+
+def test_send_transaction_commits_all_messages():
+    broker, manager = transactional_manager()
+
+    async def run():
+        assert await manager.connect_producer(transactional_id='tx')
+        return await manager.send_transaction('out', [('k', {'i': 1}), ('k', {'i': 2})])
+
+    assert asyncio.run(run())
+    assert topic_values(broker, 'out') == [b'{"i": 1}', b'{"i": 2}']
+
+
+def test_send_transaction_aborts_on_failure():
+    broker, manager = transactional_manager(fail_on=lambda value: value == b'{"i": 2}')
+
+    async def run():
+        assert await manager.connect_producer(transactional_id='tx')
+        return await manager.send_transaction('out', [('k', {'i': 1}), ('k', {'i': 2})])
+
+    assert not asyncio.run(run())
+    assert topic_values(broker, 'out') == []
+    assert manager.producer.aborted == 1
+
+
+def run_transform(manager, transform, batches, max_records=3):
+    """Transform up to batches polls of the 'in' topic into 'out'."""
+    polls = 0
+
+    def should_continue():
+        nonlocal polls
+        polls += 1
+        return polls <= batches
+
+    async def run():
+        assert await manager.connect_producer(transactional_id='tx')
+        for i in range(6):
+            await manager.producer.send('in', {'i': i}, key='k')
+        assert await manager.connect_consumer(['in'], 'g', enable_auto_commit=False)
+        return await manager.transform_messages('out', transform, 'g', should_continue=should_continue,
+                                                poll_timeout_ms=10, max_records=max_records)
+
+    return run
+
+
+def test_transform_commits_offsets_including_dropped_records():
+    broker, manager = transactional_manager()
+
+    def transform(key, value):
+        # Drop the tail of each batch: its offsets must still be committed
+        return None if value['i'] % 3 == 2 else (key, {'i': value['i'] * 10})
+
+    assert asyncio.run(run_transform(manager, transform, batches=2)()) == 6
+    tp = TopicPartition('in', 0)
+    assert manager.producer.committed_offsets == [({tp: 3}, 'g'), ({tp: 6}, 'g')]
+    assert topic_values(broker, 'out') == [b'{"i": 0}', b'{"i": 10}', b'{"i": 30}', b'{"i": 40}']
+
+
+def test_aborted_transform_rewinds_to_batch_start():
+    broker, manager = transactional_manager()
+
+    def transform(key, value):
+        if value['i'] == 4:
+            raise ValueError("bad record")
+        return key, value
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_transform(manager, transform, batches=2)())
+
+    tp = TopicPartition('in', 0)
+    # The first batch committed; the second was aborted and rewound to its first record
+    assert manager.producer.committed_offsets == [({tp: 3}, 'g')]
+    assert manager.producer.aborted == 1
+    assert asyncio.run(manager.consumer.position(tp)) == 3
+    assert topic_values(broker, 'out') == [b'{"i": 0}', b'{"i": 1}', b'{"i": 2}']
+
+
+def test_add_overhead_uses_acks_all_baseline():
+    results = add_overhead([
+        {'mode': 'plain', 'messages_per_sec': 1000.0},
+        {'mode': 'plain-acks-all', 'messages_per_sec': 800.0},
+        {'mode': 'idempotent', 'messages_per_sec': 600.0},
+        {'mode': 'transactional', 'error': 'failed'},
+    ])
+    assert 'throughput_overhead_pct' not in results[0]
+    assert (results[1]['baseline'], results[1]['throughput_overhead_pct']) == ('plain', 20.0)
+    assert (results[2]['baseline'], results[2]['throughput_overhead_pct']) == ('plain-acks-all', 25.0)
+    assert 'throughput_overhead_pct' not in results[3]
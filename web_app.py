@@ -3,11 +3,23 @@ Web-based Kafka Test GUI using Streamlit.
 """
 import os
 import streamlit as st
-from kafka_manager import KafkaManager
+from kafka_manager import (
+    KafkaManager, ConsumerSession, START_MODES, STOP_MODES, consumer_position_options
+)
+from profiling import PROFILER
+from message_filters import MessageFilter
+from fanout import ROUTING_MODES, TopicRouter, fan_out, format_report
+from stream_aggregation import WindowedAggregator, aggregating_callback
+from sequence_checker import SequenceChecker, checking_callback
 import json
 import asyncio
+from collections import deque
 from datetime import datetime
 import time
+import uuid
+
+# Keep memory bounded during long sessions; only the tail is displayed anyway
+MAX_LOG_ENTRIES = 1000
 
 # Page config
 st.set_page_config(
@@ -21,12 +33,37 @@ if 'kafka_manager' not in st.session_state:
     st.session_state.kafka_manager = None
 if 'consuming' not in st.session_state:
     st.session_state.consuming = False
+if 'consumer_session' not in st.session_state:
+    st.session_state.consumer_session = None
 if 'messages_log' not in st.session_state:
-    st.session_state.messages_log = []
+    st.session_state.messages_log = deque(maxlen=MAX_LOG_ENTRIES)
 if 'messages_sent' not in st.session_state:
     st.session_state.messages_sent = 0
 if 'messages_received' not in st.session_state:
     st.session_state.messages_received = 0
+if 'sequence_checker' not in st.session_state:
+    st.session_state.sequence_checker = None
+if 'producer_id' not in st.session_state:
+    # Test messages carry a per-key sequence that keeps counting across clicks
+    st.session_state.producer_id = uuid.uuid4().hex
+    st.session_state.key_sequences = {}
+
+
+def build_test_messages(count):
+    """Build test messages cycling through 3 keys, each with its own sequence."""
+    messages = []
+    for i in range(count):
+        key = f"key-{i % 3}"
+        sequence = st.session_state.key_sequences.get(key, 0) + 1
+        st.session_state.key_sequences[key] = sequence
+        messages.append((key, {
+            "message": f"Test message {sequence}",
+            "producer_id": st.session_state.producer_id,
+            "sequence": sequence,
+            "timestamp": datetime.now().isoformat()
+        }))
+    return messages
+
 
 st.title("📨 Kafka Queue Test GUI")
 
@@ -61,6 +98,24 @@ with st.sidebar:
         st.success("✅ Connected")
     else:
         st.warning("⚠️ Not connected")
+    
+    st.header("Profiling")
+    profile_enabled = st.checkbox("Profile stages", value=PROFILER.enabled)
+    sample_every = st.number_input("Sample every Nth call", min_value=1, value=PROFILER.sample_every)
+    if profile_enabled and not PROFILER.enabled:
+        PROFILER.reset()
+        PROFILER.enable(sample_every=int(sample_every))
+    elif not profile_enabled and PROFILER.enabled:
+        PROFILER.disable()
+    
+    if PROFILER.breakdown():
+        st.dataframe(PROFILER.breakdown(), hide_index=True)
+        st.download_button(
+            "Download collapsed stacks",
+            data=PROFILER.collapsed(),
+            file_name="kafka-profile.folded",
+            mime="text/plain"
+        )
 
 # Main content
 col1, col2 = st.columns(2)
@@ -89,9 +144,27 @@ with col1:
             st.warning("Please connect to Kafka first")
 
     st.header("📤 Producer - Send Messages")
-    producer_topic = st.text_input("Topic", value="test-topic", key="producer_topic")
+    producer_topic = st.text_input(
+        "Topic(s)", value="test-topic", key="producer_topic",
+        help="Several comma-separated topics fan out according to the routing mode"
+    )
     message_key = st.text_input("Key (optional)", key="message_key")
     
+    col_route1, col_route2 = st.columns(2)
+    with col_route1:
+        routing_mode = st.selectbox("Routing", ROUTING_MODES, key="routing_mode")
+    with col_route2:
+        route_field = st.text_input(
+            "Route field", key="route_field",
+            help="For field routing: $.region, optionally with routes as $.region:EU=orders-eu,US=orders-us"
+        )
+    try:
+        router = TopicRouter.parse(producer_topic, routing_mode, route_field)
+    except ValueError as e:
+        # False, unlike None, means "do not send": the topic text is not a single topic
+        router = False
+        st.error(f"Invalid routing: {e}")
+    
     message_text = st.text_area(
         "Message (JSON)",
         value='{"message": "Hello Kafka", "timestamp": ""}',
@@ -101,24 +174,37 @@ with col1:
     
     col_send1, col_send2 = st.columns(2)
     with col_send1:
-        if st.button("Send Message", type="primary"):
+        if st.button("Send Message", type="primary", disabled=router is False):
             if st.session_state.kafka_manager:
                 try:
                     message = json.loads(message_text)
                     message["timestamp"] = datetime.now().isoformat()
-                    success = st.session_state.kafka_manager.run_async(
-                        st.session_state.kafka_manager.send_message(
-                            producer_topic, message, message_key or None
+                    if router:
+                        report = st.session_state.kafka_manager.run_async(
+                            fan_out(st.session_state.kafka_manager, router, [(message_key or None, message)])
                         )
-                    )
-                    if success:
-                        st.session_state.messages_sent += 1
+                        success = not report['failed']
+                        sent = report['acked']
+                        destination = ', '.join(t for t, d in report['destinations'].items() if d['sent'])
+                    else:
+                        success = st.session_state.kafka_manager.run_async(
+                            st.session_state.kafka_manager.send_message(
+                                producer_topic, message, message_key or None
+                            )
+                        )
+                        sent = 1 if success else 0
+                        destination = producer_topic
+                    if sent:
+                        st.session_state.messages_sent += sent
                         st.session_state.messages_log.append({
                             'timestamp': datetime.now(),
                             'source': 'PRODUCER',
-                            'message': f"Sent to {producer_topic}: {json.dumps(message)}"
+                            'message': f"Sent to {destination}: {json.dumps(message)}"
                         })
+                    if success:
                         st.success("Message sent!")
+                    elif router:
+                        st.error(format_report(report))
                     else:
                         st.error("Failed to send message")
                 except json.JSONDecodeError:
@@ -129,16 +215,30 @@ with col1:
                 st.warning("Please connect to Kafka first")
     
     with col_send2:
-        if st.button("Send Multiple (10)"):
-            if st.session_state.kafka_manager:
+        if st.button("Send Multiple (10)", disabled=router is False):
+            if st.session_state.kafka_manager and router:
+                messages = build_test_messages(10)
+                try:
+                    # Fan-out sends concurrently on the producer's own loop
+                    report = st.session_state.kafka_manager.run_async(
+                        fan_out(st.session_state.kafka_manager, router, messages)
+                    )
+                    st.session_state.messages_sent += report['acked']
+                    for line in format_report(report).splitlines():
+                        st.session_state.messages_log.append({
+                            'timestamp': datetime.now(),
+                            'source': 'PRODUCER',
+                            'message': line
+                        })
+                    st.success(f"Sent {report['acked']} of {report['sends']} messages")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+            elif st.session_state.kafka_manager:
+                messages = build_test_messages(10)
+                
                 async def send_all():
-                    for i in range(10):
-                        message = {
-                            "message": f"Test message {i+1}",
-                            "sequence": i+1,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        key = f"key-{i % 3}"
+                    for key, message in messages:
+                        message["timestamp"] = datetime.now().isoformat()
                         if await st.session_state.kafka_manager.send_message(producer_topic, message, key):
                             st.session_state.messages_sent += 1
                             st.session_state.messages_log.append({
@@ -163,51 +263,154 @@ with col2:
         key="consumer_topics"
     )
     
+    col_pos1, col_pos2 = st.columns(2)
+    with col_pos1:
+        start_mode = st.selectbox("Start from", START_MODES, key="start_mode")
+        start_value = st.text_input(
+            "Start value", key="start_value",
+            help="Offsets as '0:100,1:250', N for 'last N', ISO time or epoch ms for 'timestamp'"
+        )
+    with col_pos2:
+        stop_mode = st.selectbox("Stop at", STOP_MODES, key="stop_mode")
+        stop_value = st.text_input(
+            "Stop value", key="stop_value",
+            help="Offsets as '0:100,1:250' or ISO time / epoch ms"
+        )
+    
+    filter_spec = st.text_input(
+        "Filter (optional)", key="filter_spec",
+        help="Semicolon-separated terms, e.g. key^=user-; partition=0,2; contains=ERROR; $.amount>100"
+    )
+    
+    with st.expander("Windowed aggregation"):
+        aggregate_field = st.text_input(
+            "Aggregate field", key="aggregate_field",
+            help="JSON path of a numeric field, e.g. $.amount (empty to disable)"
+        )
+        col_agg1, col_agg2, col_agg3 = st.columns(3)
+        with col_agg1:
+            aggregate_group_by = st.text_input(
+                "Group by", value="key", key="aggregate_group_by",
+                help="'key', a JSON path such as $.region, or 'none'"
+            )
+        with col_agg2:
+            aggregate_window = st.number_input("Window (s)", min_value=0.1, value=10.0, key="aggregate_window")
+        with col_agg3:
+            aggregate_slide = st.number_input(
+                "Slide (s)", min_value=0.0, value=0.0, key="aggregate_slide",
+                help="0 for tumbling windows"
+            )
+    
+    check_sequences = st.checkbox(
+        "Check sequences", key="check_sequences",
+        help="Report gaps, duplicates and reorders of the per-key 'sequence' field"
+    )
+    
     col_cons1, col_cons2 = st.columns(2)
     with col_cons1:
         if st.button("Start Consumer", disabled=st.session_state.consuming):
             if st.session_state.kafka_manager:
                 topics = [t.strip() for t in consumer_topics.split(",")]
+                try:
+                    position_options = consumer_position_options(start_mode, start_value, stop_mode, stop_value)
+                except ValueError as e:
+                    st.error(f"Invalid start/stop position: {e}")
+                    st.stop()
+                try:
+                    message_filter = MessageFilter.parse(filter_spec)
+                except ValueError as e:
+                    st.error(f"Invalid filter: {e}")
+                    st.stop()
+                if check_sequences and message_filter and not message_filter.keeps_whole_keys():
+                    st.error("Sequence checks need every message of a key: remove contains= and $. terms from the filter")
+                    st.stop()
+                aggregator = None
+                if aggregate_field.strip():
+                    try:
+                        aggregator = WindowedAggregator(
+                            aggregate_field.strip(),
+                            window_sec=aggregate_window,
+                            slide_sec=aggregate_slide or None,
+                            group_by=None if aggregate_group_by.strip() in ('', 'none') else aggregate_group_by.strip()
+                        )
+                    except ValueError as e:
+                        st.error(f"Invalid aggregation: {e}")
+                        st.stop()
                 
-                async def start_consume():
-                    success = await st.session_state.kafka_manager.connect_consumer(topics)
-                    if success:
-                        st.session_state.consuming = True
+                def message_callback(topic, partition, offset, key, value):
+                    if st.session_state.consuming:
+                        st.session_state.messages_received += 1
+                        st.session_state.messages_log.append({
+                            'timestamp': datetime.now(),
+                            'source': 'CONSUMER',
+                            'message': f"[{topic}:{partition}:{offset}] Key: {key}, Value: {json.dumps(value)}"
+                        })
+                
+                def on_results(results):
+                    for result in results:
+                        st.session_state.messages_log.append({
+                            'timestamp': datetime.now(),
+                            'source': 'AGGREGATE',
+                            'message': aggregator.format_result(result)
+                        })
+                
+                callback = message_callback
+                if aggregator is not None:
+                    callback = aggregating_callback(aggregator, on_results, message_callback)
+                
+                def close_idle_windows():
+                    # Close windows on processing time while the topics are idle
+                    results = aggregator.advance()
+                    if results:
+                        on_results(results)
+                
+                on_poll = close_idle_windows if aggregator is not None else None
+                
+                st.session_state.sequence_checker = SequenceChecker() if check_sequences else None
+                if st.session_state.sequence_checker is not None:
+                    def on_anomaly(event, description):
+                        st.session_state.messages_log.append({
+                            'timestamp': datetime.now(),
+                            'source': 'SEQUENCE',
+                            'message': description
+                        })
+                    
+                    callback = checking_callback(st.session_state.sequence_checker, on_anomaly, callback)
+                
+                def on_finished(error):
+                    # Runs on the session thread once the consumer is closed
+                    if aggregator is not None:
+                        on_results(aggregator.flush())
+                    if error is not None:
+                        st.session_state.messages_log.append({
+                            'timestamp': datetime.now(),
+                            'source': 'ERROR',
+                            'message': f"Consumer error: {error}"
+                        })
+                    elif st.session_state.consuming:
                         st.session_state.messages_log.append({
                             'timestamp': datetime.now(),
                             'source': 'SYSTEM',
-                            'message': f"Started consuming from topics: {', '.join(topics)}"
+                            'message': "Consumer reached stop position"
                         })
-                        
-                        def message_callback(topic, partition, offset, key, value):
-                            if st.session_state.consuming:
-                                st.session_state.messages_received += 1
-                                st.session_state.messages_log.append({
-                                    'timestamp': datetime.now(),
-                                    'source': 'CONSUMER',
-                                    'message': f"[{topic}:{partition}:{offset}] Key: {key}, Value: {json.dumps(value)}"
-                                })
-                        
-                        def should_continue():
-                            return st.session_state.consuming
-                        
-                        try:
-                            await st.session_state.kafka_manager.consume_messages(
-                                message_callback, should_continue=should_continue
-                            )
-                        except Exception as e:
-                            if st.session_state.consuming:
-                                st.session_state.messages_log.append({
-                                    'timestamp': datetime.now(),
-                                    'source': 'ERROR',
-                                    'message': f"Consumer error: {e}"
-                                })
-                                st.session_state.consuming = False
+                    st.session_state.consuming = False
+                    st.session_state.consumer_session = None
                 
                 try:
-                    st.session_state.kafka_manager.run_async_in_thread(start_consume())
+                    st.session_state.consuming = True
+                    st.session_state.consumer_session = ConsumerSession(
+                        st.session_state.kafka_manager, topics, callback,
+                        on_finished=on_finished, message_filter=message_filter, on_poll=on_poll,
+                        **position_options
+                    ).start()
+                    st.session_state.messages_log.append({
+                        'timestamp': datetime.now(),
+                        'source': 'SYSTEM',
+                        'message': f"Started consuming from topics: {', '.join(topics)}"
+                    })
                     st.success("Consumer started!")
                 except Exception as e:
+                    st.session_state.consuming = False
                     st.error(f"Error: {e}")
             else:
                 st.warning("Please connect to Kafka first")
@@ -215,6 +418,9 @@ with col2:
     with col_cons2:
         if st.button("Stop Consumer", disabled=not st.session_state.consuming):
             st.session_state.consuming = False
+            session = st.session_state.consumer_session
+            if session and not session.stop(timeout=5.0):
+                st.warning("Consumer is still shutting down")
             st.session_state.messages_log.append({
                 'timestamp': datetime.now(),
                 'source': 'SYSTEM',
@@ -232,15 +438,23 @@ with col_stats1:
     st.metric("Messages Sent", st.session_state.messages_sent)
 with col_stats2:
     st.metric("Messages Received", st.session_state.messages_received)
+if st.session_state.sequence_checker is not None:
+    sequence_metrics = st.session_state.sequence_checker.metrics()
+    col_seq1, col_seq2, col_seq3, col_seq4 = st.columns(4)
+    col_seq1.metric("Sequence Gaps", sequence_metrics['gaps'])
+    col_seq2.metric("Missing", sequence_metrics['missing'])
+    col_seq3.metric("Duplicates", sequence_metrics['duplicates'])
+    col_seq4.metric("Reorders", sequence_metrics['reorders'])
 
 if st.button("Clear Log"):
-    st.session_state.messages_log = []
+    st.session_state.messages_log.clear()
     st.rerun()
 
 # Display log
+render_token = PROFILER.begin('ui;render') if PROFILER.enabled else 0
 log_container = st.container()
 with log_container:
-    for msg in st.session_state.messages_log[-100:]:  # Show last 100 messages
+    for msg in list(st.session_state.messages_log)[-100:]:  # Show last 100 messages
         timestamp = msg['timestamp'].strftime("%H:%M:%S.%f")[:-3] if isinstance(msg['timestamp'], datetime) else str(msg['timestamp'])
         source = msg['source']
         message = msg['message']
@@ -249,10 +463,14 @@ with log_container:
             'PRODUCER': '🟢',
             'CONSUMER': '🔵',
             'SYSTEM': '🟡',
+            'AGGREGATE': '🟣',
+            'SEQUENCE': '🟠',
             'ERROR': '🔴'
         }
         
         st.text(f"[{timestamp}] {color_map.get(source, '⚪')} [{source}] {message}")
+if render_token:
+    PROFILER.end('ui;render', render_token)
 
 # Auto-refresh when consumer is running
 if st.session_state.consuming: